@@ -0,0 +1,307 @@
+# analytics.py
+"""
+Vectorized attendance analytics.
+
+A filter (branch / batch / roll / date range) is loaded with a single query
+into a (students x days) presence matrix, and every metric is computed on
+that matrix with NumPy instead of one query per student. The query returns
+one row per student and is filled into the matrix in chunks, so memory stays
+at the size of the matrix rather than of the attendance rows.
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, case, cast, func, literal, Date, Integer, String
+from sqlalchemy.orm import Session
+
+from models import Student, Attendance
+
+
+LOAD_CHUNK_STUDENTS = 1000  # aggregated rows (one per student) per fetch
+LOAD_CHUNK_ROWS = 50_000    # attendance rows per fetch on other databases
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+@dataclass
+class PresenceMatrix:
+    start: date
+    rolls: np.ndarray          # (n,) roll numbers, sorted
+    names: np.ndarray          # (n,) student names
+    branches: np.ndarray       # (n,) student branches
+    present: np.ndarray        # (n, d) bool, True where the student was marked Present
+    recorded: np.ndarray       # (n, d) bool, True where any attendance row exists
+    load_ms: float = 0.0
+    rows_loaded: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def days(self) -> np.ndarray:
+        return np.datetime64(self.start, "D") + np.arange(self.present.shape[1])
+
+    @property
+    def held(self) -> np.ndarray:
+        """Days on which attendance was taken for anyone in the cohort."""
+        return self.recorded.any(axis=0)
+
+    @property
+    def nbytes(self) -> int:
+        return self.present.nbytes + self.recorded.nbytes
+
+    def meta(self) -> dict:
+        return {
+            "students": int(self.present.shape[0]),
+            "days": int(self.present.shape[1]),
+            "working_days": int(self.held.sum()),
+            "matrix_bytes": int(self.nbytes),
+            "attendance_rows": self.rows_loaded,
+            "load_ms": round(self.load_ms, 2),
+            "elapsed_ms": round((time.perf_counter() - self.started_at) * 1000, 2),
+        }
+
+
+def _filter_students(stmt, branch, issue_valid, roll):
+    if branch:
+        stmt = stmt.where(Student.branch == branch)
+    if issue_valid:
+        start_filter, end_filter = map(int, issue_valid.split("-"))
+        stmt = stmt.where(Student.issue_valid.ilike(f"{start_filter}-%"))
+    if roll:
+        stmt = stmt.where(Student.roll == roll.upper())
+    return stmt
+
+
+def _day_codes(dialect: str, start: date):
+    """
+    Per-student aggregate of day_offset * 2 + present as a comma-separated
+    string, or None when the dialect has no string aggregate we know of.
+    """
+    is_present = case((Attendance.status == "Present", 1), else_=0)
+    if dialect == "sqlite":
+        offset = cast(func.julianday(Attendance.date) - func.julianday(start.isoformat()), Integer)
+        return func.group_concat(offset * 2 + is_present, ",")
+    if dialect == "postgresql":
+        offset = Attendance.date - literal(start, Date)
+        return func.string_agg(cast(offset * 2 + is_present, String), ",")
+    return None
+
+
+def _fill(present: np.ndarray, recorded: np.ndarray, row_idx: np.ndarray, codes: np.ndarray):
+    """Set the cells for one chunk of (student row, day_offset * 2 + present) codes."""
+    day_idx = codes >> 1
+    hit = (codes & 1).astype(bool)
+    recorded[row_idx, day_idx] = True
+    present[row_idx[hit], day_idx[hit]] = True
+
+
+def load_presence_matrix(
+    db: Session,
+    start: date,
+    end: date,
+    branch: str | None = None,
+    issue_valid: str | None = None,
+    roll: str | None = None,
+) -> PresenceMatrix:
+    """Load attendance for the filtered students between start and end (inclusive)."""
+    started_at = time.perf_counter()
+    n_days = max((end - start).days + 1, 0)
+
+    roster = db.execute(
+        _filter_students(select(Student.roll, Student.name, Student.branch), branch, issue_valid, roll)
+    ).all()
+    if not roster:
+        empty = np.array([], dtype=object)
+        matrix = np.zeros((0, n_days), dtype=bool)
+        return PresenceMatrix(start, empty, empty, empty, matrix, matrix.copy(),
+                              load_ms=(time.perf_counter() - started_at) * 1000, started_at=started_at)
+
+    # Sorted here rather than with ORDER BY: searchsorted needs NumPy's code
+    # point order, which the database collation does not have to match.
+    roll_col, name_col, branch_col = zip(*roster)
+    rolls = np.asarray(roll_col, dtype=str)
+    order = np.argsort(rolls, kind="stable")
+    rolls = rolls[order]
+    names = np.asarray(name_col, dtype=object)[order]
+    branches = np.asarray(branch_col, dtype=object)[order]
+
+    present = np.zeros((len(rolls), n_days), dtype=bool)
+    recorded = np.zeros((len(rolls), n_days), dtype=bool)
+    in_range = (Attendance.date >= start, Attendance.date <= end)
+    rows_loaded = 0
+
+    codes_agg = _day_codes(db.get_bind().dialect.name, start)
+    if codes_agg is not None:
+        # One row per student: the database packs each student's days into a
+        # string, so the driver builds 2 Python objects per student instead
+        # of 3 per attendance row.
+        stmt = _filter_students(
+            select(Attendance.roll, codes_agg)
+            .join(Student, Student.roll == Attendance.roll)
+            .where(*in_range)
+            .group_by(Attendance.roll),
+            branch, issue_valid, roll,
+        )
+        for chunk in db.execute(stmt.execution_options(stream_results=True)).partitions(LOAD_CHUNK_STUDENTS):
+            chunk_rolls, packed = zip(*chunk)
+            counts = np.fromiter((p.count(",") + 1 for p in packed), dtype=np.int64, count=len(packed))
+            codes = np.fromstring(",".join(packed), dtype=np.int64, sep=",")
+            row_idx = np.repeat(np.searchsorted(rolls, np.asarray(chunk_rolls, dtype=str)), counts)
+            _fill(present, recorded, row_idx, codes)
+            rows_loaded += len(codes)
+    else:
+        stmt = _filter_students(
+            select(Attendance.roll, Attendance.date, case((Attendance.status == "Present", 1), else_=0))
+            .join(Student, Student.roll == Attendance.roll)
+            .where(*in_range),
+            branch, issue_valid, roll,
+        )
+        start_day = np.datetime64(start, "D")
+        for chunk in db.execute(stmt.execution_options(stream_results=True)).partitions(LOAD_CHUNK_ROWS):
+            att_roll, att_date, att_status = zip(*chunk)
+            row_idx = np.searchsorted(rolls, np.asarray(att_roll, dtype=str))
+            day_idx = (np.asarray(att_date, dtype="datetime64[D]") - start_day).astype(np.int64)
+            _fill(present, recorded, row_idx, day_idx * 2 + np.asarray(att_status, dtype=np.int64))
+            rows_loaded += len(chunk)
+
+    return PresenceMatrix(start, rolls, names, branches, present, recorded,
+                          load_ms=(time.perf_counter() - started_at) * 1000, started_at=started_at,
+                          rows_loaded=rows_loaded)
+
+
+# ----------------- Metrics -----------------
+def percentages(pm: PresenceMatrix, total_working_days: int | None = None) -> np.ndarray:
+    """Present days / working days per student, in percent."""
+    working = total_working_days if total_working_days is not None else int(pm.held.sum())
+    if working <= 0:
+        return np.zeros(len(pm.rolls))
+    return np.round(pm.present.sum(axis=1) / working * 100, 2)
+
+
+def streaks(pm: PresenceMatrix) -> tuple[np.ndarray, np.ndarray]:
+    """(current, longest) runs of consecutive working days present, per student."""
+    m = pm.present[:, pm.held]
+    n, d = m.shape
+    if d == 0:
+        return np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+
+    # Current streak: number of trailing True values.
+    rev = m[:, ::-1]
+    current = np.where(rev.all(axis=1), d, np.argmin(rev, axis=1))
+
+    # Longest streak: pair up run starts (+1) and ends (-1) of the padded rows.
+    padded = np.zeros((n, d + 2), dtype=np.int8)
+    padded[:, 1:-1] = m
+    edges = np.diff(padded, axis=1)
+    start_rows, start_cols = np.nonzero(edges == 1)
+    _, end_cols = np.nonzero(edges == -1)
+    longest = np.zeros(n, dtype=np.int64)
+    np.maximum.at(longest, start_rows, end_cols - start_cols)
+    return current.astype(np.int64), longest
+
+
+def student_trends(pm: PresenceMatrix) -> np.ndarray:
+    """Least-squares slope of each student's presence over working days (per 30 working days)."""
+    m = pm.present[:, pm.held].astype(np.float64)
+    d = m.shape[1]
+    if d < 2:
+        return np.zeros(m.shape[0])
+    x = np.arange(d, dtype=np.float64)
+    x -= x.mean()
+    slope = (m @ x) / float((x * x).sum())
+    return np.round(slope * 30, 4)
+
+
+def daily_rates(pm: PresenceMatrix) -> tuple[np.ndarray, np.ndarray]:
+    """(days, cohort present rate) for every working day in the range."""
+    held = pm.held
+    n = max(pm.present.shape[0], 1)
+    return pm.days[held], pm.present[:, held].sum(axis=0) / n
+
+
+def trend(pm: PresenceMatrix) -> dict:
+    days, rates = daily_rates(pm)
+    if len(days) >= 2:
+        x = (days - days[0]).astype(np.float64)
+        slope, intercept = np.polyfit(x, rates, 1)
+    else:
+        slope, intercept = 0.0, float(rates[0]) if len(rates) else 0.0
+    return {
+        "slope_per_day": round(float(slope) * 100, 4),
+        "intercept": round(float(intercept) * 100, 2),
+        "daily": [
+            {"date": str(d), "attendance_percentage": round(float(r) * 100, 2)}
+            for d, r in zip(days, rates)
+        ],
+    }
+
+
+def weekday_pattern(pm: PresenceMatrix) -> list[dict]:
+    """Cohort attendance rate per weekday, over working days only."""
+    weekday = (pm.days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    present = np.bincount(weekday, weights=pm.present.sum(axis=0), minlength=7)
+    recorded = np.bincount(weekday, weights=pm.recorded.sum(axis=0), minlength=7)
+    rate = np.divide(present, recorded, out=np.zeros(7), where=recorded > 0)
+    return [
+        {"weekday": WEEKDAYS[i], "records": int(recorded[i]), "attendance_percentage": round(float(rate[i]) * 100, 2)}
+        for i in range(7)
+    ]
+
+
+def branch_comparison(pm: PresenceMatrix, total_working_days: int | None = None) -> list[dict]:
+    if len(pm.rolls) == 0:
+        return []
+    pct = percentages(pm, total_working_days)
+    labels, group = np.unique(pm.branches.astype(str), return_inverse=True)
+    counts = np.bincount(group, minlength=len(labels))
+    mean = np.bincount(group, weights=pct, minlength=len(labels)) / counts
+    out = []
+    for i, label in enumerate(labels):
+        g = pct[group == i]
+        out.append({
+            "branch": label,
+            "students": int(counts[i]),
+            "mean_percentage": round(float(mean[i]), 2),
+            "median_percentage": round(float(np.median(g)), 2),
+            "min_percentage": round(float(g.min()), 2),
+            "max_percentage": round(float(g.max()), 2),
+        })
+    return out
+
+
+def student_summary(pm: PresenceMatrix, total_working_days: int | None = None) -> list[dict]:
+    pct = percentages(pm, total_working_days)
+    present = pm.present.sum(axis=1)
+    current, longest = streaks(pm)
+    slopes = student_trends(pm)
+    return [
+        {
+            "roll": pm.rolls[i],
+            "name": pm.names[i],
+            "branch": pm.branches[i],
+            "present_days": int(present[i]),
+            "attendance_percentage": float(pct[i]),
+            "current_streak": int(current[i]),
+            "longest_streak": int(longest[i]),
+            "trend": float(slopes[i]),
+        }
+        for i in range(len(pm.rolls))
+    ]
+
+
+def defaulters(pm: PresenceMatrix, threshold: float, total_working_days: int | None = None) -> list[dict]:
+    """Students below the threshold percentage, lowest first."""
+    pct = percentages(pm, total_working_days)
+    present = pm.present.sum(axis=1)
+    idx = np.nonzero(pct < threshold)[0]
+    idx = idx[np.argsort(pct[idx], kind="stable")]
+    return [
+        {
+            "roll": pm.rolls[i],
+            "name": pm.names[i],
+            "branch": pm.branches[i],
+            "present_days": int(present[i]),
+            "attendance_percentage": float(pct[i]),
+        }
+        for i in idx
+    ]
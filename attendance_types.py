@@ -0,0 +1,338 @@
+# attendance_types.py
+"""
+Compact column types for attendance.status and attendance.time.
+
+The API and the ORM keep using strings ("Present" / "Absent", "09:15"); the
+database stores:
+    status  SMALLINT   Absent = 0, Present = 1
+    time    TIME       NULL when no time was recorded (the mark-absent job);
+                       INTEGER seconds since midnight on SQLite
+
+Existing text columns are converted once by migrate(), which init_db runs on
+startup. It reports the size of the table and its indexes before and after.
+Legacy time strings that parse_clock cannot read (e.g. "9.15 AM") become NULL
+and are listed in the report instead of failing the migration.
+
+CLI:
+    python attendance_types.py status
+    python attendance_types.py migrate
+"""
+import sys
+from collections import Counter
+from datetime import date, datetime, time as dt_time
+
+from sqlalchemy import Integer, SmallInteger, Time, inspect, insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator
+
+
+STATUS_CODES = {"Absent": 0, "Present": 1}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+_STATUS_BY_LOWER = {name.lower(): code for name, code in STATUS_CODES.items()}
+
+CLOCK_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M:%S %p", "%H:%M:%S.%f")
+
+MIGRATE_BATCH_SIZE = 5000
+
+
+def status_code(value: str) -> int:
+    """'present' / 'Present' -> 1; ValueError for anything else."""
+    try:
+        return _STATUS_BY_LOWER[value.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown attendance status {value!r}, expected one of {', '.join(STATUS_CODES)}")
+
+
+def normalize_status(value: str) -> str:
+    """Canonical spelling of a status filter ('absent' -> 'Absent')."""
+    return STATUS_NAMES[status_code(value)]
+
+
+def parse_clock(value: str) -> dt_time:
+    value = value.strip()
+    for fmt in CLOCK_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time {value!r}, expected HH:MM")
+
+
+def format_clock(value: dt_time) -> str:
+    return value.strftime("%H:%M" if not value.second and not value.microsecond else "%H:%M:%S")
+
+
+class AttendanceStatus(TypeDecorator):
+    """'Present' / 'Absent' in Python, a small integer in the database."""
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return status_code(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else STATUS_NAMES.get(value, str(value))
+
+
+class ClockTime(TypeDecorator):
+    """'HH:MM' strings in Python ('' when unset), TIME in the database."""
+    impl = Time
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        # SQLite has no time type; seconds since midnight is small and sorts correctly
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(Integer())
+        return dialect.type_descriptor(Time())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or value == "":
+            return None
+        if not isinstance(value, dt_time):
+            value = parse_clock(value)
+        if dialect.name == "sqlite":
+            return value.hour * 3600 + value.minute * 60 + value.second
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return ""
+        if isinstance(value, int):
+            value = dt_time(value // 3600, value // 60 % 60, value % 60)
+        return format_clock(value)
+
+
+# ----------------- Migration -----------------
+def needs_migration(conn) -> bool:
+    """True while attendance still has the old text status / time columns."""
+    if not inspect(conn).has_table("attendance"):
+        return False
+    columns = {c["name"]: c["type"] for c in inspect(conn).get_columns("attendance")}
+    time_ok = isinstance(columns["time"], Integer if conn.dialect.name == "sqlite" else Time)
+    return not isinstance(columns["status"], Integer) or not time_ok
+
+
+def table_sizes(engine: Engine) -> dict | None:
+    """Bytes used by attendance and each of its indexes (all partitions included), or None if unknown."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            # pg_partition_tree returns no rows for a plain (unpartitioned) table
+            tree = "SELECT 'attendance'::regclass AS relid UNION SELECT relid FROM pg_partition_tree('attendance')"
+            table_bytes = conn.execute(text(
+                f"SELECT COALESCE(sum(pg_table_size(relid)), 0) FROM ({tree}) t"
+            )).scalar()
+            indexes = dict(conn.execute(text(
+                "SELECT i.indexrelid::regclass::text, pg_relation_size(i.indexrelid) FROM pg_index i "
+                f"WHERE i.indrelid IN ({tree})"
+            )).all())
+        elif engine.dialect.name == "sqlite":
+            try:
+                sizes = dict(conn.execute(text(
+                    "SELECT d.name, sum(d.pgsize) FROM dbstat d JOIN sqlite_master m ON m.name = d.name "
+                    "WHERE m.tbl_name = 'attendance' GROUP BY d.name"
+                )).all())
+            except Exception:
+                return None  # SQLite built without the dbstat table
+            table_bytes = sizes.pop("attendance", 0)
+            indexes = sizes
+        else:
+            return None
+        rows = conn.execute(text("SELECT count(*) FROM attendance")).scalar()
+    return {
+        "rows": rows,
+        "table_bytes": int(table_bytes),
+        "index_bytes": int(sum(indexes.values())),
+        "indexes": {name: int(size) for name, size in sorted(indexes.items())},
+    }
+
+
+def _check_statuses(conn):
+    unknown = conn.execute(text(
+        "SELECT DISTINCT status FROM attendance WHERE lower(status) NOT IN ('present', 'absent')"
+    )).scalars().all()
+    if unknown:
+        raise RuntimeError(f"attendance has unknown status values {unknown}; fix them before migrating")
+
+
+def _read_clock(value: str | None, unparsable: Counter):
+    """Legacy time text -> time, or None when empty or unreadable (counted in `unparsable`)."""
+    if value is None or not value.strip():
+        return None
+    try:
+        return parse_clock(value)
+    except ValueError:
+        unparsable[value] += 1
+        return None
+
+
+def _normalize_times_postgres(conn, unparsable: Counter):
+    # Rewrite the values the ::time cast below would reject or read
+    # differently from parse_clock; one pass per distinct value, not per row.
+    for value, rows in conn.execute(text("SELECT time, count(*) FROM attendance GROUP BY time")).all():
+        canonical = ""
+        if value is not None and value.strip():
+            try:
+                canonical = format_clock(parse_clock(value))
+            except ValueError:
+                unparsable[value] += rows
+        if canonical != value:
+            conn.execute(text("UPDATE attendance SET time = :canonical WHERE time = :value"),
+                         {"canonical": canonical, "value": value})
+
+
+def _migrate_postgres(conn, unparsable: Counter):
+    _normalize_times_postgres(conn, unparsable)
+    # One rewrite of the table; on a partitioned table this cascades to every partition
+    conn.execute(text(
+        "ALTER TABLE attendance "
+        "ALTER COLUMN status TYPE SMALLINT USING CASE lower(status) WHEN 'present' THEN 1 ELSE 0 END, "
+        "ALTER COLUMN time DROP NOT NULL, "
+        "ALTER COLUMN time TYPE TIME USING NULLIF(btrim(time), '')::time"
+    ))
+
+
+def _migrate_sqlite(conn, unparsable: Counter):
+    from models import Attendance
+
+    # SQLite cannot change a column type: rebuild the table and copy the rows.
+    # Indexes keep their names across a rename, so drop them before recreating.
+    old_indexes = [ix["name"] for ix in inspect(conn).get_indexes("attendance")]
+    conn.execute(text("ALTER TABLE attendance RENAME TO attendance_untyped"))
+    for name in old_indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    # The new table is created with its unique indexes, which the copy would violate
+    for index in Attendance.__table__.indexes:
+        if index.unique:
+            _drop_duplicate_marks(conn, [c.name for c in index.columns], table="attendance_untyped")
+    Attendance.__table__.create(conn)
+    result = conn.execute(text("SELECT id, roll, date, time, status FROM attendance_untyped ORDER BY id"))
+    while True:
+        batch = result.fetchmany(MIGRATE_BATCH_SIZE)
+        if not batch:
+            break
+        # Statuses go through AttendanceStatus on the way in, times are parsed here
+        conn.execute(insert(Attendance.__table__), [
+            {"id": id_, "roll": roll, "date": date.fromisoformat(day),
+             "time": _read_clock(clock, unparsable), "status": status}
+            for id_, roll, day, clock, status in batch
+        ])
+    conn.execute(text("DROP TABLE attendance_untyped"))
+
+
+def migrate(engine: Engine) -> dict | None:
+    """
+    Convert attendance.status / attendance.time to their compact types.
+    Returns {"before": sizes, "after": sizes, "unparsable_times": {value: rows}},
+    or None when already migrated.
+    """
+    with engine.connect() as conn:
+        if not needs_migration(conn):
+            return None
+    before = table_sizes(engine)
+    unparsable = Counter()
+    with engine.begin() as conn:
+        _check_statuses(conn)
+        if engine.dialect.name == "postgresql":
+            _migrate_postgres(conn, unparsable)
+        elif engine.dialect.name == "sqlite":
+            _migrate_sqlite(conn, unparsable)
+        else:
+            raise RuntimeError(f"No attendance type migration for {engine.dialect.name}")
+    # SQLite keeps the freed pages in the file until VACUUM; the sizes below count live pages only
+    return {"before": before, "after": table_sizes(engine), "unparsable_times": dict(unparsable)}
+
+
+# Present before Absent, whether status is still text or already SMALLINT
+_PRESENT_FIRST = "CASE WHEN lower(CAST(status AS TEXT)) IN ('1', 'present') THEN 0 ELSE 1 END"
+
+
+def _drop_duplicate_marks(conn, columns: list[str], table: str = "attendance") -> int:
+    """
+    Keep one row of each group of `columns`: a Present mark over an Absent one
+    (the mark-absent job racing a real mark), then the lowest id. Every removed
+    row is logged; the summaries of the affected rolls are rebuilt on next read.
+    """
+    from models import AttendanceSummary
+
+    cols = ", ".join(columns)
+    window = f"PARTITION BY {cols} ORDER BY {_PRESENT_FIRST}, id"
+    duplicates = conn.execute(text(
+        f"SELECT id, roll, date, time, status, kept FROM ("
+        f"SELECT id, roll, date, time, status, row_number() OVER ({window}) AS n, "
+        f"first_value(id) OVER ({window}) AS kept FROM {table}) ranked WHERE n > 1 ORDER BY id"
+    )).all()
+    if not duplicates:
+        return 0
+    for id_, roll, day, clock, status, kept in duplicates:
+        print(f"Removing duplicate attendance row id={id_} roll={roll} date={day} "
+              f"status={STATUS_NAMES.get(status, status)} time={clock} (kept id={kept})")
+    ids = [row.id for row in duplicates]
+    for i in range(0, len(ids), MIGRATE_BATCH_SIZE):
+        conn.execute(text(f"DELETE FROM {table} WHERE id IN ({', '.join(map(str, ids[i:i + MIGRATE_BATCH_SIZE]))})"))
+    if inspect(conn).has_table(AttendanceSummary.__tablename__):
+        rolls = sorted({row.roll for row in duplicates})
+        conn.execute(AttendanceSummary.__table__.delete().where(AttendanceSummary.roll.in_(rolls)))
+    return len(ids)
+
+
+def ensure_indexes(engine: Engine):
+    """
+    Indexes declared on Attendance that an existing table may not have yet.
+    Before a unique index is created, or a plain one of the same name rebuilt
+    as unique, the rows that would violate it are removed.
+    """
+    from models import Attendance
+
+    with engine.begin() as conn:
+        existing = {ix["name"]: ix for ix in inspect(conn).get_indexes("attendance")}
+        for index in Attendance.__table__.indexes:
+            current = existing.get(index.name)
+            if index.unique and not (current and current["unique"]):
+                removed = _drop_duplicate_marks(conn, [c.name for c in index.columns])
+                if removed:
+                    print(f"Removed {removed} duplicate attendance rows before making {index.name} unique")
+                if current is not None:
+                    conn.execute(text(f'DROP INDEX "{index.name}"'))
+            index.create(conn, checkfirst=True)
+
+
+def _format_sizes(sizes: dict | None) -> str:
+    if sizes is None:
+        return "size unknown"
+    per_index = ", ".join(f"{name} {size / 1024:.0f}" for name, size in sizes["indexes"].items())
+    return (f"{sizes['rows']} rows, table {sizes['table_bytes'] / 1024:.0f} KiB, "
+            f"indexes {sizes['index_bytes'] / 1024:.0f} KiB ({per_index})")
+
+
+def describe(result: dict) -> str:
+    summary = f"attendance before: {_format_sizes(result['before'])}; after: {_format_sizes(result['after'])}"
+    unparsable = result.get("unparsable_times")
+    if unparsable:
+        shown = ", ".join(f"{value!r} x{rows}" for value, rows in sorted(unparsable.items(), key=lambda v: -v[1])[:10])
+        more = f" and {len(unparsable) - 10} more" if len(unparsable) > 10 else ""
+        summary += f"; {sum(unparsable.values())} unreadable times set to NULL: {shown}{more}"
+    return summary
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    engine = get_engine()
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "status":
+        with engine.connect() as conn:
+            print(f"needs migration: {needs_migration(conn)}")
+        print(_format_sizes(table_sizes(engine)))
+    elif command == "migrate":
+        import versions
+        from database import Base
+
+        result = migrate(engine)
+        Base.metadata.create_all(bind=engine)
+        ensure_indexes(engine)
+        versions.install_version_triggers(engine)  # the SQLite rebuild drops the table's triggers
+        print(describe(result) if result else "already migrated")
+    else:
+        sys.exit(f"Unknown command {command!r}")
@@ -1,17 +1,20 @@
 # auth.py
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from ratelimit import hashing_slot
 
 # Secret key for JWT (change this in production!)
 SECRET_KEY = "super-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context (passlib/bcrypt and jose are imported on first use)
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # OAuth2 scheme (not strictly needed for your case unless protecting routes)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -19,18 +22,21 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 # ---------- Password Utils ----------
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Check plain password against stored hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Check plain password against stored hash (503 if all hashing slots are busy)"""
+    with hashing_slot():
+        return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password for storing"""
-    return pwd_context.hash(password)
+    """Hash a password for storing (503 if all hashing slots are busy)"""
+    with hashing_slot():
+        return get_pwd_context().hash(password)
 
 
 # ---------- Token Utils ----------
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """Create JWT token with expiry"""
+    from jose import jwt
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
@@ -39,6 +45,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 
 def decode_access_token(token: str) -> dict:
     """Decode and validate a JWT token"""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
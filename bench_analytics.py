@@ -0,0 +1,102 @@
+# bench_analytics.py
+"""
+Presence matrix load and metrics for a whole cohort.
+
+Seeds `students` students with one mark per day (Sundays off) over `days`
+days, then times what /attendance/analysis/students does: the matrix load
+(analytics.load_presence_matrix) and analytics.student_summary, plus the
+other metrics for reference. Peak Python memory is measured in a separate
+run under tracemalloc, which slows everything down.
+
+Usage: python bench_analytics.py [students] [days] [repeats]
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file. The tables are
+dropped and reseeded: point it at a scratch database.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import analytics
+from database import Base
+from models import Student, Attendance
+
+TARGET_SECONDS = 1.0
+
+
+def seed(engine, students: int, days: int) -> tuple[date, date]:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Student), [
+            dict(roll=f"A{i:05d}", name=f"Analytics {i}", branch=["CSE", "ECE", "ME"][i % 3],
+                 dob=date(2005, 1, 1), issue_valid="2024-28", pin="x", photo="")
+            for i in range(students)
+        ])
+    for d in range(days):
+        day = start + timedelta(days=d)
+        if day.weekday() == 6:
+            continue
+        with engine.begin() as conn:
+            conn.execute(insert(Attendance), [
+                dict(roll=f"A{i:05d}", date=day, time="09:00", status="Present" if (i * 7 + d) % 9 else "Absent")
+                for i in range(students)
+            ])
+    return start, end
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main(students: int, days: int, repeats: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        seeded_at = time.perf_counter()
+        start, end = seed(engine, students, days)
+        print(f"{engine.dialect.name}: seeded {students} students x {days} days "
+              f"in {time.perf_counter() - seeded_at:.0f} s")
+        Session = sessionmaker(bind=engine)
+
+        loads, summaries, others = [], [], []
+        for _ in range(repeats):
+            with Session() as db:
+                pm, load = _timed(lambda: analytics.load_presence_matrix(db, start, end))
+            _, summary = _timed(lambda: analytics.student_summary(pm))
+            _, other = _timed(lambda: (analytics.weekday_pattern(pm), analytics.trend(pm),
+                                       analytics.branch_comparison(pm), analytics.defaulters(pm, 75.0)))
+            loads.append(load)
+            summaries.append(summary)
+            others.append(other)
+
+        tracemalloc.start()
+        with Session() as db:
+            analytics.student_summary(analytics.load_presence_matrix(db, start, end))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        engine.dispose()
+
+    total = statistics.median(l + s for l, s in zip(loads, summaries))
+    meta = pm.meta()
+    print(f"{meta['attendance_rows']} attendance rows, matrix {meta['matrix_bytes'] / 2**20:.1f} MiB, "
+          f"peak Python memory {peak / 2**20:.0f} MiB")
+    print(f"median of {repeats}: load {statistics.median(loads):.2f} s, student_summary "
+          f"{statistics.median(summaries):.2f} s, other metrics {statistics.median(others):.2f} s")
+    verdict = "within" if total <= TARGET_SECONDS else f"{total / TARGET_SECONDS:.1f}x over"
+    print(f"/attendance/analysis/students work: {total:.2f} s ({verdict} the {TARGET_SECONDS:.0f} s target)")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [10000, 365, 3][len(args):]))
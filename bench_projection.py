@@ -0,0 +1,101 @@
+# bench_projection.py
+"""
+Payload size and cost of one GET /students page, before and after the
+`fields=` projection.
+
+Seeds a throwaway SQLite database with realistic rows (bcrypt-length pin
+hashes, Cloudinary URLs) and times, for a single page:
+  - before: ORM entities for every column, validated into StudentResponse
+            (what the endpoint did when it returned list[StudentResponse])
+  - after:  Core select of the requested columns, serialized by json_response
+
+Usage: python bench_projection.py [rows] [repeats]
+"""
+import gzip
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from database import Base
+from models import Student
+from schemas import StudentResponse
+from utils import json_response
+
+PROJECTIONS = {
+    "all public columns": ["roll", "name", "branch", "dob", "issue_valid", "photo", "device_id"],
+    "fields=roll,name,branch": ["roll", "name", "branch"],
+}
+
+
+def seed(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Student), [
+            dict(roll=f"P{i:05d}", name=f"Projection Student {i}", branch=["CSE", "ECE", "ME"][i % 3],
+                 dob=date(2005, 1 + i % 12, 1 + i % 28), issue_valid="2024-28",
+                 pin="$2b$12$" + "x" * 53,
+                 photo=f"https://res.cloudinary.com/demo/image/upload/v1700000000/students/{i:05d}abcdef.jpg",
+                 photo_public_id=f"students/{i:05d}abcdef")
+            for i in range(rows)
+        ])
+    return engine
+
+
+def _request(accept_gzip: bool) -> Request:
+    headers = [(b"accept-encoding", b"gzip")] if accept_gzip else []
+    return Request({"type": "http", "method": "GET", "path": "/students", "headers": headers})
+
+
+def _timed(fn, repeats: int):
+    times, result = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+
+def main(rows: int, repeats: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = seed(os.path.join(tmp, "bench.db"), rows)
+        Session = sessionmaker(bind=engine)
+        adapter = TypeAdapter(list[StudentResponse])
+
+        def before():
+            with Session() as db:
+                students = db.query(Student).offset(0).limit(rows).all()
+                return adapter.dump_json(adapter.validate_python(students, from_attributes=True))
+
+        def after(columns, accept_gzip):
+            def run():
+                with Session() as db:
+                    stmt = select(*[getattr(Student, c) for c in columns]).offset(0).limit(rows)
+                    page = [dict(r) for r in db.execute(stmt).mappings().all()]
+                return json_response(_request(accept_gzip), page).body
+            return run
+
+        print(f"{rows} rows per page, median of {repeats}")
+        print(f"{'variant':<40} {'ms':>8} {'bytes':>11}")
+        ms, body = _timed(before, repeats)
+        print(f"{'before: all columns incl. pin (ORM)':<40} {ms:8.1f} {len(body):11,d}")
+        print(f"{'before, if it had been gzipped':<40} {'':>8} {len(gzip.compress(body, 5)):11,d}")
+        for label, columns in PROJECTIONS.items():
+            for accept_gzip in (False, True):
+                ms, body = _timed(after(columns, accept_gzip), repeats)
+                name = f"after: {label}{' + gzip' if accept_gzip else ''}"
+                print(f"{name:<40} {ms:8.1f} {len(body):11,d}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [10000, 5][len(args):]))
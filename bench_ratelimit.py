@@ -0,0 +1,130 @@
+# bench_ratelimit.py
+"""
+/attendance/mark latency during a flood of /apk/login attempts.
+
+Seeds a SQLite database whose students have real bcrypt PIN hashes, starts
+uvicorn and measures /attendance/mark latency twice: on an idle server and
+while FLOODERS threads send wrong-PIN logins for many different rolls as fast
+as they can, all from one address (a campus NAT). Reports mark latency and
+how the logins were answered: 401 wrong PIN (a bcrypt verify was done),
+429 rate limited, 503 no free hashing slot.
+
+Usage: python bench_ratelimit.py [students] [marks] [flooders]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import create_engine, insert
+
+from auth import get_pwd_context
+from bench_startup import HERE, _free_port
+from database import Base
+from models import Student
+
+
+def seed(path: str, students: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    pin_hash = get_pwd_context().hash("1234")
+    with engine.begin() as conn:
+        conn.execute(insert(Student), [
+            dict(roll=f"L{i:05d}", name=f"Login {i}", branch="CSE", dob=date(2005, 1, 1),
+                 issue_valid="2024-28", pin=pin_hash, photo="")
+            for i in range(students)
+        ])
+    engine.dispose()
+
+
+def _post(url: str, body: dict) -> tuple[int, float]:
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def _marks(base: str, rolls: range) -> list[float]:
+    return [_post(base + "/attendance/mark", {"roll": f"L{i:05d}", "date": str(date.today()), "time": "09:00"})[1]
+            for i in rolls]
+
+
+def _summary(label: str, values: list[float]) -> str:
+    values = sorted(values)
+    p95 = values[max(int(len(values) * 0.95) - 1, 0)]
+    return (f"{label:<18} /attendance/mark median {statistics.median(values) * 1000:7.1f} ms   "
+            f"p95 {p95 * 1000:7.1f} ms   max {values[-1] * 1000:7.1f} ms")
+
+
+def main(students: int, marks: int, flooders: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, students)
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", SCHEDULER_ENABLED="0")
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            for _ in range(300):
+                try:
+                    urllib.request.urlopen(base + "/", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.05)
+
+            idle = _marks(base, range(0, marks))
+
+            stop = threading.Event()
+            outcomes = Counter()
+            lock = threading.Lock()
+
+            def flood(n: int):
+                i = n
+                while not stop.is_set():
+                    roll = f"L{i % students:05d}"
+                    status, _ = _post(base + "/apk/login", {"roll": roll, "pin": "0000", "device_id": f"dev-{i}"})
+                    with lock:
+                        outcomes[status] += 1
+                    i += flooders
+
+            threads = [threading.Thread(target=flood, args=(n,), daemon=True) for n in range(flooders)]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            time.sleep(1)
+            flooded = _marks(base, range(marks, 2 * marks))
+            stop.set()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(_summary("idle", idle))
+    print(_summary(f"{flooders} login flooders", flooded))
+    total = sum(outcomes.values())
+    answered = ", ".join(f"{code}: {count}" for code, count in sorted(outcomes.items()))
+    print(f"logins during flood: {total} in {elapsed:.1f} s ({total / elapsed:.0f}/s) -> {answered}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [2000, 200, 16][len(args):]))
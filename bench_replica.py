@@ -0,0 +1,120 @@
+# bench_replica.py
+"""
+Write-path latency while reports run, with and without a read replica.
+
+Seeds a SQLite primary, copies it as the "replica", then starts uvicorn twice:
+once with only DATABASE_URL and once with READ_DATABASE_URL pointing at the
+copy. In both runs a few threads keep hitting the reporting endpoints while
+/attendance/mark latency is measured.
+
+Usage: python bench_replica.py [students] [days] [marks]
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert
+
+from bench_startup import HERE, _free_port
+from database import Base
+from models import Student, Attendance
+
+READERS = 4
+
+
+def seed(path: str, students: int, days: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    start = date.today() - timedelta(days=days)
+    with engine.begin() as conn:
+        conn.execute(insert(Student), [
+            dict(roll=f"B{i:05d}", name=f"Bench {i}", branch=["CSE", "ECE", "ME"][i % 3],
+                 dob=date(2005, 1, 1), issue_valid="2024-28", pin="x", photo="")
+            for i in range(students)
+        ])
+        conn.execute(insert(Attendance), [
+            dict(roll=f"B{i:05d}", date=start + timedelta(days=d), time="09:00",
+                 status="Present" if (i + d) % 5 else "Absent")
+            for d in range(days) for i in range(students)
+        ])
+    engine.dispose()
+
+
+def _request(url: str, body: dict | None = None) -> float:
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        resp.read()
+    return time.perf_counter() - started
+
+
+def run(env: dict, students: int, days: int, marks: int) -> list[float]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    stop = threading.Event()
+    try:
+        for _ in range(300):
+            try:
+                _request(base + "/")
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        report_url = (base + "/attendance/analysis/students?from_date="
+                      f"{date.today() - timedelta(days=days)}&to_date={date.today()}")
+
+        def reader():
+            while not stop.is_set():
+                _request(report_url)
+
+        threads = [threading.Thread(target=reader, daemon=True) for _ in range(READERS)]
+        for t in threads:
+            t.start()
+        time.sleep(1)
+        latencies = [
+            _request(base + "/attendance/mark", {"roll": f"B{i:05d}", "date": str(date.today()), "time": "09:00"})
+            for i in range(marks)
+        ]
+        stop.set()
+        return latencies
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(students: int, days: int, marks: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for label, with_replica in (("primary only", False), ("with replica", True)):
+            primary = os.path.join(tmp, f"primary_{with_replica}.db")
+            replica = os.path.join(tmp, f"replica_{with_replica}.db")
+            seed(primary, students, days)
+            shutil.copy(primary, replica)
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{primary}")
+            env.pop("READ_DATABASE_URL", None)
+            if with_replica:
+                env["READ_DATABASE_URL"] = f"sqlite:///{replica}"
+            results[label] = run(env, students, days, marks)
+    for label, values in results.items():
+        values = sorted(values)
+        p95 = values[int(len(values) * 0.95) - 1]
+        print(f"{label:<14} /attendance/mark median {statistics.median(values) * 1000:7.1f} ms   "
+              f"p95 {p95 * 1000:7.1f} ms   max {values[-1] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [2000, 90, 100][len(args):]))
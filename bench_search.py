@@ -0,0 +1,83 @@
+# bench_search.py
+"""
+Latency of student name search as the students table grows.
+
+For each size, seeds a throwaway SQLite database, installs the search index
+(search.install_search_index) and times, per query:
+  - scan:      Student.name ILIKE '%q%' without the index (what the name
+               filter did before search.py)
+  - filter:    GET /students?name=q, i.e. search.name_filter + LIMIT 100
+  - typeahead: search.search_students (GET /students/search)
+
+Usage: python bench_search.py [sizes] [repeats]     e.g. 1000,10000,100000 20
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import search
+from database import Base
+from models import Student
+
+FIRST = ["Aarav", "Diya", "Ishaan", "Kavya", "Rohan", "Sneha", "Vikram", "Ananya", "Arjun", "Meera",
+         "Karthik", "Pooja", "Rahul", "Nisha", "Siddharth", "Lakshmi", "Aditya", "Priya", "Manoj", "Divya"]
+LAST = ["Sharma", "Reddy", "Iyer", "Nair", "Gupta", "Patel", "Rao", "Menon", "Singh", "Kumar",
+        "Das", "Joshi", "Pillai", "Verma", "Chopra", "Bhat", "Naidu", "Kulkarni", "Mishra", "Shetty"]
+QUERIES = ["ka", "Sneha", "rao", "ish Me", "S0004", "zzz", "100%"]
+
+
+def seed(path: str, rows: int):
+    rng = random.Random(rows)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Student), [
+            dict(roll=f"S{i:06d}", name=f"{rng.choice(FIRST)} {rng.choice(LAST)} {rng.choice(LAST)}",
+                 branch=["CSE", "ECE", "ME"][i % 3], dob=date(2005, 1, 1), issue_valid="2024-28",
+                 pin="x", photo="")
+            for i in range(rows)
+        ])
+    search.install_search_index(engine)
+    return engine
+
+
+def _median_ms(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main(sizes: str, repeats: int):
+    print(f"median ms of {repeats} runs per query")
+    print(f"{'rows':>8} {'query':<10} {'scan':>8} {'filter':>8} {'typeahead':>10}")
+    for rows in (int(s) for s in sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = seed(os.path.join(tmp, "bench.db"), rows)
+            Session = sessionmaker(bind=engine)
+            with Session() as db:
+                for q in QUERIES:
+                    scan = _median_ms(lambda: db.execute(
+                        select(Student.roll, Student.name).where(Student.name.ilike(f"%{q}%")).limit(100)
+                    ).all(), repeats)
+                    filtered = _median_ms(lambda: db.execute(
+                        select(Student.roll, Student.name).where(search.name_filter(db, q)).limit(100)
+                    ).all(), repeats)
+                    typeahead = _median_ms(lambda: search.search_students(db, q), repeats)
+                    print(f"{rows:>8} {q!r:<10} {scan:8.2f} {filtered:8.2f} {typeahead:10.2f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sizes = args[0] if args else "1000,10000,100000"
+    main(sizes, int(args[1]) if len(args) > 1 else 20)
@@ -0,0 +1,74 @@
+# bench_startup.py
+"""
+Cold-start benchmark.
+
+Measures, in fresh interpreters:
+  - import time of `main` (what every new worker pays before serving)
+  - time to first response: spawn uvicorn and poll GET / until it answers
+
+Usage: python bench_startup.py [runs]
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file.
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env(db_dir: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=HERE, env=env, text=True)
+    return float(out.strip().splitlines()[-1])
+
+
+def first_response_time(env: dict, timeout: float = 30.0) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("server did not answer")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(runs: int):
+    with tempfile.TemporaryDirectory() as db_dir:
+        env = _env(db_dir)
+        imports = [import_time(env) for _ in range(runs)]
+        firsts = [first_response_time(env) for _ in range(runs)]
+    for label, values in (("import main", imports), ("time to first response", firsts)):
+        print(f"{label:<24} median {statistics.median(values) * 1000:8.1f} ms   "
+              f"min {min(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -1,13 +1,27 @@
-from dotenv import load_dotenv
 import os
-import cloudinary
+import threading
 
-load_dotenv()
+_configured = False
+_lock = threading.Lock()
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
 
+def uploader():
+    """Import and configure Cloudinary on first use, return cloudinary.uploader."""
+    global _configured
+    import cloudinary
+    import cloudinary.uploader
+
+    if not _configured:
+        with _lock:
+            if not _configured:
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                cloudinary.config(
+                    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+                    api_key=os.getenv("CLOUDINARY_API_KEY"),
+                    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+                    secure=True
+                )
+                _configured = True
+    return cloudinary.uploader
@@ -1,19 +1,116 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# Load environment variables from .env file
-load_dotenv()
+import querylog
 
-DATABASE_URL = os.environ.get("DATABASE_URL")
+Base = declarative_base()
 
-if not DATABASE_URL:
-    raise ValueError("No DATABASE_URL environment variable set")
+_engine = None
+_read_engine = None
+_read_engine_checked = False
+_engine_lock = threading.Lock()
 
-engine = create_engine(DATABASE_URL)
+# Replica health is checked at most this often; in between the last result is reused.
+REPLICA_CHECK_INTERVAL = 5.0
+_replica_state = {"checked_at": 0.0, "usable": False, "lag": None}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
+def get_engine():
+    """Create the engine on first use (keeps imports free of I/O and env lookups)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # Load environment variables from .env file
+                load_dotenv()
+                database_url = os.environ.get("DATABASE_URL")
+                if not database_url:
+                    raise ValueError("No DATABASE_URL environment variable set")
+                _engine = create_engine(database_url)
+                querylog.install(_engine)
+    return _engine
+
+
+_Session = sessionmaker(autocommit=False, autoflush=False)
+
+
+def SessionLocal():
+    return _Session(bind=get_engine())
+
+
+# ----------------- Read replica -----------------
+def get_read_engine():
+    """Engine for READ_DATABASE_URL, or None when no replica is configured."""
+    global _read_engine, _read_engine_checked
+    if not _read_engine_checked:
+        with _engine_lock:
+            if not _read_engine_checked:
+                # Looked up once, like DATABASE_URL: "no replica" is cached too
+                load_dotenv()
+                read_url = os.environ.get("READ_DATABASE_URL")
+                if read_url:
+                    _read_engine = create_engine(read_url, pool_pre_ping=True)
+                    querylog.install(_read_engine)
+                _read_engine_checked = True
+    return _read_engine
+
+
+def _max_lag() -> float | None:
+    value = os.environ.get("READ_REPLICA_MAX_LAG_SECONDS")
+    return float(value) if value else None
+
+
+def replica_lag(engine) -> float:
+    """Seconds the replica is behind the primary (0 when it cannot tell, e.g. SQLite)."""
+    with engine.connect() as conn:
+        if engine.dialect.name != "postgresql":
+            conn.exec_driver_sql("SELECT 1")
+            return 0.0
+        # The replay timestamp is that of the last replayed transaction, so
+        # now() minus it keeps growing while the primary is idle. A replica
+        # that has replayed everything it received is caught up.
+        lag = conn.exec_driver_sql(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+            "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        ).scalar()
+        return float(lag or 0)
+
+
+def replica_status() -> dict:
+    engine = get_read_engine()
+    if engine is None:
+        return {"configured": False, "usable": False, "lag": None}
+    now = time.monotonic()
+    if now - _replica_state["checked_at"] >= REPLICA_CHECK_INTERVAL:
+        try:
+            lag = replica_lag(engine)
+            max_lag = _max_lag()
+            _replica_state.update(usable=max_lag is None or lag <= max_lag, lag=lag)
+        except Exception as e:
+            print(f"Read replica unavailable, using primary: {e}")
+            _replica_state.update(usable=False, lag=None)
+        _replica_state["checked_at"] = now
+    return {"configured": True, "usable": _replica_state["usable"], "lag": _replica_state["lag"]}
+
+
+def ReadSessionLocal():
+    """
+    Session for read-only reporting queries: the replica when it is reachable
+    and within READ_REPLICA_MAX_LAG_SECONDS, otherwise the primary.
+    """
+    if replica_status()["usable"]:
+        return _Session(bind=get_read_engine())
+    return SessionLocal()
+
+
+def __getattr__(name):
+    # `from database import engine` still works, and only then creates the engine
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,68 @@
+# jobs.py
+"""
+Maintenance jobs run by the scheduler (and triggered by /tasks/*).
+Each job takes a session and returns the number of rows it touched.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, insert, delete, exists, and_, literal, null
+from sqlalchemy.orm import Session
+
+from models import Student, Attendance, SyncReceipt
+import partitions
+import summaries
+
+
+def mark_absent(db: Session) -> int:
+    """Insert an Absent row (no time) for every student without a mark today (one INSERT ... SELECT)."""
+    today = date.today()
+    already_marked = exists().where(and_(Attendance.roll == Student.roll, Attendance.date == today))
+    # Counters first: afterwards "not marked today" no longer selects these students
+    summaries.record_bulk(db, select(Student.roll).where(~already_marked), today, "Absent")
+    stmt = insert(Attendance).from_select(
+        ["roll", "date", "time", "status"],
+        select(Student.roll, literal(today), null(), literal("Absent", Attendance.status.type)).where(~already_marked),
+    )
+    rows = db.execute(stmt).rowcount
+    db.commit()
+    return rows
+
+
+def expired_rolls(db: Session, today: datetime) -> list[str]:
+    rolls = []
+    for roll, issue_valid in db.execute(select(Student.roll, Student.issue_valid).where(Student.issue_valid != None)):
+        try:
+            end_year = int(issue_valid.split("-")[1])
+            if end_year < 100:
+                end_year += 2000
+            if today > datetime(end_year, 12, 31):
+                rolls.append(roll)
+        except Exception as e:
+            print(f"Error reading issue_valid for student {roll}: {e}")
+    return rolls
+
+
+def delete_expired_students(db: Session) -> int:
+    """Delete students whose batch ended before this year, with their attendance."""
+    rolls = expired_rolls(db, datetime.today())
+    for i in range(0, len(rolls), 500):
+        chunk = rolls[i:i + 500]
+        db.execute(delete(Attendance).where(Attendance.roll.in_(chunk)))
+        db.execute(delete(SyncReceipt).where(SyncReceipt.roll.in_(chunk)))
+        summaries.remove(db, chunk)
+        db.execute(delete(Student).where(Student.roll.in_(chunk)))
+    db.commit()
+    return len(rolls)
+
+
+def cleanup_old_attendance(db: Session) -> int:
+    """Remove attendance older than a year (whole partitions when partitioned)."""
+    cutoff_date = (datetime.today() - timedelta(days=365)).date()
+    engine = db.get_bind()
+    if partitions.partitioned(engine):
+        deleted_count = partitions.drop_before(engine, cutoff_date)
+        partitions.ensure_partitions(engine)
+        return deleted_count
+    deleted_count = db.query(Attendance).filter(Attendance.date < cutoff_date).delete()
+    db.commit()
+    return deleted_count
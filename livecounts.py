@@ -0,0 +1,195 @@
+# livecounts.py
+"""
+Live "present today" counters per branch and batch, pushed over SSE.
+
+Each app instance keeps today's counts in memory. /attendance/mark and
+/apk/sync bump them after their commit. A background task reconciles them
+from the database every LIVE_RECONCILE_SECONDS, which also picks up marks
+made by other instances, the mark-absent job and deletions. It also
+broadcasts to the connected dashboards.
+
+Broadcasts are coalesced: at most one snapshot per LIVE_PUSH_INTERVAL,
+serialized once and shared by every subscriber. Each subscriber holds only
+the latest snapshot, so a slow dashboard skips intermediate states instead
+of queueing them. Open dashboards therefore cost no database queries; the
+reconcile is one GROUP BY per instance per interval.
+
+Env:
+    LIVE_PUSH_INTERVAL=1          seconds between pushes (when something changed)
+    LIVE_RECONCILE_SECONDS=60
+    LIVE_HEARTBEAT_SECONDS=15     SSE comment sent to idle connections
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func, case, and_
+
+from database import SessionLocal
+from models import Student, Attendance
+
+
+LIVE_PUSH_INTERVAL = float(os.getenv("LIVE_PUSH_INTERVAL", "1"))
+LIVE_RECONCILE_SECONDS = float(os.getenv("LIVE_RECONCILE_SECONDS", "60"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+
+
+def _today_counts(db, today: date) -> dict:
+    """{(branch, batch): [students, present, absent]} for `today`, in one query."""
+    stmt = (
+        select(
+            Student.branch,
+            Student.issue_valid,
+            func.count(Student.roll),
+            func.coalesce(func.sum(case((Attendance.status == "Present", 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Attendance.status == "Absent", 1), else_=0)), 0),
+        )
+        .select_from(Student)
+        .outerjoin(Attendance, and_(Attendance.roll == Student.roll, Attendance.date == today))
+        .group_by(Student.branch, Student.issue_valid)
+    )
+    return {(branch, batch): [students, present, absent] for branch, batch, students, present, absent in db.execute(stmt)}
+
+
+class LiveCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.day: date | None = None
+        self.counts: dict[tuple, list[int]] = {}
+        self.version = 0
+        self.reconciled_at: datetime | None = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+        self._payload = ""
+        self._payload_version = -1
+
+    # ----------------- Updates -----------------
+    def record(self, branch: str | None, batch: str | None, status: str, day: date | None = None):
+        """Count one committed mark. Marks for another day than the counters' are left to reconcile."""
+        day = day or date.today()
+        with self._lock:
+            if day != self.day:
+                return
+            row = self.counts.setdefault((branch, batch), [0, 0, 0])
+            if status == "Present":
+                row[1] += 1
+            elif status == "Absent":
+                row[2] += 1
+            self.version += 1
+
+    def reconcile(self):
+        """Replace the counters with the database's view of today."""
+        today = date.today()
+        db = SessionLocal()
+        try:
+            counts = _today_counts(db, today)
+        finally:
+            db.close()
+        with self._lock:
+            if counts != self.counts or today != self.day:
+                self.counts = counts
+                self.version += 1
+            self.day = today
+            self.reconciled_at = datetime.utcnow()
+
+    # ----------------- Snapshots -----------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = {key: list(row) for key, row in self.counts.items()}
+            day, reconciled_at, version = self.day, self.reconciled_at, self.version
+        branches: dict[str, dict] = {}
+        totals = {"students": 0, "present": 0, "absent": 0}
+        for (branch, batch), (students, present, absent) in sorted(counts.items(), key=lambda kv: (str(kv[0][0]), str(kv[0][1]))):
+            entry = branches.setdefault(branch, {"branch": branch, "students": 0, "present": 0, "absent": 0, "batches": []})
+            entry["batches"].append({"batch": batch, "students": students, "present": present, "absent": absent,
+                                     "unmarked": max(students - present - absent, 0)})
+            for key, value in (("students", students), ("present", present), ("absent", absent)):
+                entry[key] += value
+                totals[key] += value
+        for entry in branches.values():
+            entry["unmarked"] = max(entry["students"] - entry["present"] - entry["absent"], 0)
+        totals["unmarked"] = max(totals["students"] - totals["present"] - totals["absent"], 0)
+        return {
+            "date": day,
+            "version": version,
+            "reconciled_at": reconciled_at,
+            "totals": totals,
+            "branches": list(branches.values()),
+        }
+
+    def _serialized(self) -> str:
+        # Serialized once per version and shared by every subscriber
+        if self._payload_version != self.version:
+            self._payload = json.dumps(self.snapshot(), default=str, separators=(",", ":"))
+            self._payload_version = self.version
+        return self._payload
+
+    # ----------------- Broadcasting -----------------
+    async def subscribe(self):
+        """Async iterator of SSE frames: the current snapshot, then one per change, plus heartbeats."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        try:
+            sent = self._serialized()
+            yield f"event: counts\ndata: {sent}\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if payload == sent:
+                    continue  # already had this version as its initial frame
+                sent = payload
+                yield f"event: counts\ndata: {payload}\n\n"
+        finally:
+            self._subscribers.discard(queue)
+
+    def _publish(self, payload: str):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()  # drop the stale snapshot, keep only the latest
+            queue.put_nowait(payload)
+
+    async def _run(self):
+        # Set once the first reconcile is done: dashboards connecting from then
+        # on already receive that state as their initial frame.
+        last_pushed = None
+        last_reconcile = float("-inf")
+        while True:
+            try:
+                if time.monotonic() - last_reconcile >= LIVE_RECONCILE_SECONDS or date.today() != self.day:
+                    last_reconcile = time.monotonic()
+                    await run_in_threadpool(self.reconcile)
+                    if last_pushed is None:
+                        last_pushed = self.version
+                if self.version != last_pushed and self._subscribers:
+                    self._publish(self._serialized())
+                    last_pushed = self.version
+            except Exception as e:
+                print(f"Live counters update failed: {e}")
+            await asyncio.sleep(LIVE_PUSH_INTERVAL)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+live = LiveCounters()
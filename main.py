@@ -1,49 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Query, Header,Request
+from contextlib import asynccontextmanager, aclosing
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Query, Header,Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
 import os
-import cloudinary.uploader
 from typing import Optional,List
-from sqlalchemy import func
-
-from database import Base, engine, SessionLocal
-from models import Student, Attendance, Admin
-from schemas import StudentCreate, StudentResponse, AttendanceOut, AdminLogin, MarkAttendance
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
+
+# Before the app modules: several of them read their settings at import time
+load_dotenv()
+
+from database import Base, get_engine, SessionLocal, ReadSessionLocal, replica_status
+from models import Student, Attendance, Admin, SyncReceipt
+from scheduler import scheduler, recent_runs
+from schemas import StudentCreate, AttendanceOut, AdminLogin, MarkAttendance
 from auth import create_access_token, decode_access_token, verify_password, get_password_hash
 from schemas import StudentLogin, StudentProfileOut, AttendanceRecord, ForgotPinRequest,ResetDeviceRequest
+from schemas import StudentOut, StudentSearchOut, SyncRequest, SyncResponse, JobRunOut, AttendanceSummaryOut
 from fastapi import APIRouter, Body
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import RedirectResponse
-
-
-# ----------------- Load environment variables -----------------
-load_dotenv()
-
-MARK_ABSENT_API_KEY = os.getenv("MARK_ABSENT_API_KEY")
-
-# ----------------- Configure Cloudinary -----------------
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
-
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-# ----------------- Initialize FastAPI -----------------
-app = FastAPI(title="College Admin Backend")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+from fastapi.responses import RedirectResponse, FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+import cloudinary_config
+from utils import json_response
+import search
+import reports
+import ratelimit
+import versions
+import partitions
+import attendance_types
+import querylog
+import summaries
+from livecounts import live
+
+
+# Admin / scheduled-task routes; the student app routes live on `router` below.
+# Both are mounted by create_app() at the bottom of this file.
+api = APIRouter()
 
 # ----------------- Dependency -----------------
 def get_db():
@@ -53,22 +48,34 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Session for reporting reads: the read replica if configured and fresh enough, else the primary."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 # ----------------- API Key Verification -----------------
+def get_api_key() -> Optional[str]:
+    return os.getenv("MARK_ABSENT_API_KEY")
+
 def verify_api_key(api_key: str = Header(...)):
-    if api_key != MARK_ABSENT_API_KEY:
+    if api_key != get_api_key():
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
 # ----------------- Auth APIs -----------------
-@app.post("/auth/login")
-def login(data: AdminLogin, db: Session = Depends(get_db)):
+@api.post("/auth/login")
+def login(data: AdminLogin, request: Request, db: Session = Depends(get_db)):
+    ratelimit.check(request, "auth-login", identity=data.userId)
     admin = db.query(Admin).filter(Admin.user_id == data.userId.lower()).first()
     if not admin or not verify_password(data.password, admin.password_hash):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     token = create_access_token({"sub": admin.user_id})
     return {"token": token}
 
-@app.post("/auth/verify-answers")
+@api.post("/auth/verify-answers")
 def verify_answers(userId: str = Form(...), answer1: str = Form(...), answer2: str = Form(...), db: Session = Depends(get_db)):
     admin = db.query(Admin).filter(Admin.user_id == userId.lower()).first()
     if not admin:
@@ -77,7 +84,7 @@ def verify_answers(userId: str = Form(...), answer1: str = Form(...), answer2: s
         raise HTTPException(status_code=400, detail="Wrong answers")
     return {"ok": True}
 
-@app.post("/auth/reset-password")
+@api.post("/auth/reset-password")
 def reset_password(userId: str = Form(...), newPassword: str = Form(...), db: Session = Depends(get_db)):
     admin = db.query(Admin).filter(Admin.user_id == userId.lower()).first()
     if not admin:
@@ -88,7 +95,7 @@ def reset_password(userId: str = Form(...), newPassword: str = Form(...), db: Se
 
 
 # ----------------- Student APIs -----------------
-@app.post("/students/", response_model=StudentResponse)
+@api.post("/students/", response_model=StudentOut)
 async def create_student(
     roll: str = Form(...),
     name: str = Form(...),
@@ -105,7 +112,7 @@ async def create_student(
     if db_student:
         raise HTTPException(status_code=400, detail="Roll number already exists")
     if photo:
-        upload_result = cloudinary.uploader.upload(photo.file, folder="students")
+        upload_result = cloudinary_config.uploader().upload(photo.file, folder="students")
         photo_url = upload_result.get("secure_url")
         public_id = upload_result.get("public_id")
     else:
@@ -126,13 +133,13 @@ async def create_student(
     db.refresh(new_student)
     return new_student
 # -------------------------------rest Device---------------------------
-@app.post("/admin/reset-device")
+@api.post("/admin/reset-device")
 def admin_reset_device(
     data: ResetDeviceRequest,
     db: Session = Depends(get_db),
 ):
     # Verify API key
-    verify_api_key(MARK_ABSENT_API_KEY)
+    verify_api_key(get_api_key())
 
     # Find student
     roll = data.roll.strip().upper()
@@ -147,8 +154,27 @@ def admin_reset_device(
 
 # ---------------- studen list--------------------------------------
 
-@app.get("/students", response_model=list[StudentResponse])
+STUDENT_FIELDS = list(StudentOut.model_fields)
+
+
+def student_columns(fields: Optional[str]):
+    """Columns for a `fields=roll,name,...` projection; roll is always included, pin never."""
+    if not fields:
+        return [getattr(Student, f) for f in STUDENT_FIELDS]
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in STUDENT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(STUDENT_FIELDS)}",
+        )
+    return [Student.roll] + [getattr(Student, f) for f in dict.fromkeys(requested) if f != "roll"]
+
+
+@api.get("/students", response_model=list[StudentOut], response_model_exclude_unset=True)
 def list_students(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated columns, e.g. roll,name,branch"),
     name: str = Query(None),
     branch: str = Query(None),
     dob: str = Query(None),
@@ -156,32 +182,47 @@ def list_students(
     lastYears: int = Query(None),
     page: int = 1,
     pageSize: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    q = db.query(Student)
+    # Core select of just the requested columns: no ORM entities, never the pin hash
+    q = select(*student_columns(fields))
     if name:
-        q = q.filter(Student.name.ilike(f"%{name}%"))
+        q = q.where(search.name_filter(db, name))
     if branch:
-        q = q.filter(Student.branch == branch)
+        q = q.where(Student.branch == branch)
     if dob:
         dob_dt = datetime.strptime(dob, "%Y-%m-%d").date()
-        q = q.filter(Student.dob == dob_dt)
+        q = q.where(Student.dob == dob_dt)
     if roll:
-        q = q.filter(Student.roll == roll.upper())
+        q = q.where(Student.roll == roll.upper())
     if lastYears:
         cutoff = date.today() - timedelta(days=365 * lastYears)
-        q = q.filter(Student.issue_date >= cutoff)
-    students = q.offset((page - 1) * pageSize).limit(pageSize).all()
-    return students
+        q = q.where(Student.issue_date >= cutoff)
+    rows = db.execute(q.offset((page - 1) * pageSize).limit(pageSize)).mappings().all()
+    return json_response(request, [dict(r) for r in rows])
+# ---------------------------------student search (typeahead)--------------------
+@api.get("/students/search", response_model=list[StudentSearchOut])
+def search_students(
+    q: str = Query(..., min_length=1),
+    branch: Optional[str] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Substring search on name and prefix search on roll, best matches first."""
+    return search.search_students(db, q, limit=limit, branch=branch)
 # ---------------------------------get student detail--------------------
-@app.get("/students/{roll}", response_model=StudentResponse)
-def get_student(roll: str, db: Session = Depends(get_db)):
-    s = db.query(Student).filter(Student.roll == roll.upper()).first()
+@api.get("/students/{roll}", response_model=StudentOut, response_model_exclude_unset=True)
+def get_student(
+    roll: str,
+    fields: Optional[str] = Query(None, description="Comma-separated columns, e.g. roll,name,photo"),
+    db: Session = Depends(get_db)
+):
+    s = db.execute(select(*student_columns(fields)).where(Student.roll == roll.upper())).mappings().first()
     if not s:
         raise HTTPException(status_code=404, detail="Not found")
-    return s
+    return dict(s)
 # --------------------update student detail-----------------
-@app.put("/students/{roll}", response_model=StudentResponse)
+@api.put("/students/{roll}", response_model=StudentOut)
 def update_student(
     roll: str,
     name: Optional[str] = Form(None),
@@ -201,12 +242,12 @@ def update_student(
         # Delete old photo if exists
         if s.photo_public_id:
             try:
-                cloudinary.uploader.destroy(s.photo_public_id)
+                cloudinary_config.uploader().destroy(s.photo_public_id)
             except Exception as e:
                 print(f"Failed to delete old image: {e}")
 
         # Upload new photo
-        upload_result = cloudinary.uploader.upload(photo.file, folder="students")
+        upload_result = cloudinary_config.uploader().upload(photo.file, folder="students")
         s.photo = upload_result.get("secure_url")
         s.photo_public_id = upload_result.get("public_id")
 
@@ -232,7 +273,7 @@ def update_student(
     db.refresh(s)
     return s
 #---------------------delete student--------------------------
-@app.delete("/students/{roll}")
+@api.delete("/students/{roll}")
 def delete_student(roll: str, db: Session = Depends(get_db)):
     s = db.query(Student).filter(Student.roll == roll.upper()).first()
     if not s:
@@ -240,18 +281,28 @@ def delete_student(roll: str, db: Session = Depends(get_db)):
 
     if s.photo_public_id:
         try:
-            cloudinary.uploader.destroy(s.photo_public_id)
+            cloudinary_config.uploader().destroy(s.photo_public_id)
         except Exception as e:
             print(f"Failed to delete image from Cloudinary: {e}")
 
     db.query(Attendance).filter(Attendance.roll == roll.upper()).delete(synchronize_session=False)
+    db.query(SyncReceipt).filter(SyncReceipt.roll == roll.upper()).delete(synchronize_session=False)
+    summaries.remove(db, [roll.upper()])
     db.delete(s)
     db.commit()
     return {"ok": True}
 
 
 # ----------------- Attendance APIs -----------------
-@app.post("/attendance/mark")
+def status_filter(status: str) -> str:
+    """Exact status for an indexed equality filter ('present' -> 'Present'), 400 if unknown."""
+    try:
+        return attendance_types.normalize_status(status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@api.post("/attendance/mark")
 def mark_attendance(attendance_data: MarkAttendance, db: Session = Depends(get_db)):
     student = db.query(Student).filter(Student.roll == attendance_data.roll).first()
     if not student:
@@ -264,11 +315,18 @@ def mark_attendance(attendance_data: MarkAttendance, db: Session = Depends(get_d
         return {"message": "Attendance already marked"}
     new_record = Attendance(roll=attendance_data.roll, date=today,time=attendance_data.time, status="Present")
     db.add(new_record)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()  # a concurrent request marked it first
+        return {"message": "Attendance already marked"}
+    summaries.record(db, attendance_data.roll, today, "Present")
     db.commit()
+    live.record(student.branch, student.issue_valid, "Present", today)
     db.refresh(new_record)
     return {"message": "Attendance marked as Present"}
 
-@app.get("/attendance", response_model=list[AttendanceOut])
+@api.get("/attendance", response_model=list[AttendanceOut])
 def list_attendance(
     roll: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
@@ -276,7 +334,7 @@ def list_attendance(
     to_date: Optional[str] = Query(None),
     issue_valid: Optional[str] = Query(None),  # e.g., "2023-24"
     orderBy: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     today = date.today()
     default_start = date(today.year - 1, today.month, 1)
@@ -291,7 +349,7 @@ def list_attendance(
 
     # Filter by attendance status if provided
     if status:
-        q = q.filter(Attendance.status.ilike(f"%{status}%"))
+        q = q.filter(Attendance.status == status_filter(status))
 
     # Filter by date range
     q = q.filter(Attendance.date >= from_dt, Attendance.date <= to_dt)
@@ -315,7 +373,22 @@ def list_attendance(
 
     return q.all()
 # -------------------------------attendance analysis------------------------
-@app.get("/attendance/analysis")
+def _analysis_matrix(db: Session, branch, issue_valid, roll, from_date: str, to_date: str):
+    try:
+        start_dt = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end_dt = datetime.strptime(to_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+    if end_dt < start_dt:
+        raise HTTPException(status_code=400, detail="to_date must not be before from_date")
+    import analytics  # numpy is only loaded once analysis is used
+    try:
+        return analytics.load_presence_matrix(db, start_dt, end_dt, branch, issue_valid, roll)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid issue_valid format")
+
+
+@api.get("/attendance/analysis")
 def attendance_analysis(
         branch: Optional[str] = Query(None),
         issue_valid: Optional[str] = Query(None),  # e.g., "2023-27"
@@ -323,117 +396,202 @@ def attendance_analysis(
         from_date: str = Query(...),
         to_date: str = Query(...),
         total_working_days: int = Query(...),  # entered by teacher
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
-    # Parse dates
-    start_dt = datetime.strptime(from_date, "%Y-%m-%d").date()
-    end_dt = datetime.strptime(to_date, "%Y-%m-%d").date()
+    import analytics
+    pm = _analysis_matrix(db, branch, issue_valid, roll, from_date, to_date)
+    percentages = analytics.percentages(pm, total_working_days)
+    return [
+        {"roll": pm.rolls[i], "name": pm.names[i], "attendance_percentage": float(percentages[i])}
+        for i in range(len(pm.rolls))
+    ]
 
-    # Build query for students
-    students_q = db.query(Student)
-    if branch:
-        students_q = students_q.filter(Student.branch == branch)
-    if issue_valid:
-        start_filter, end_filter = map(int, issue_valid.split("-"))
-        students_q = students_q.filter(Student.issue_valid.ilike(f"{start_filter}-%"))
-    if roll:
-        students_q = students_q.filter(Student.roll == roll.upper())
 
-    students = students_q.all()
+@api.get("/attendance/analysis/students")
+def attendance_analysis_students(
+        branch: Optional[str] = Query(None),
+        issue_valid: Optional[str] = Query(None),
+        roll: Optional[str] = Query(None),
+        from_date: str = Query(...),
+        to_date: str = Query(...),
+        total_working_days: Optional[int] = Query(None),  # defaults to days attendance was taken
+        db: Session = Depends(get_read_db)
+):
+    """Per-student percentage, streaks and trend."""
+    import analytics
+    pm = _analysis_matrix(db, branch, issue_valid, roll, from_date, to_date)
+    students = analytics.student_summary(pm, total_working_days)
+    return {"students": students, "meta": pm.meta()}
+
+
+@api.get("/attendance/analysis/weekdays")
+def attendance_analysis_weekdays(
+        branch: Optional[str] = Query(None),
+        issue_valid: Optional[str] = Query(None),
+        roll: Optional[str] = Query(None),
+        from_date: str = Query(...),
+        to_date: str = Query(...),
+        db: Session = Depends(get_read_db)
+):
+    import analytics
+    pm = _analysis_matrix(db, branch, issue_valid, roll, from_date, to_date)
+    weekdays = analytics.weekday_pattern(pm)
+    return {"weekdays": weekdays, "meta": pm.meta()}
+
+
+@api.get("/attendance/analysis/trend")
+def attendance_analysis_trend(
+        branch: Optional[str] = Query(None),
+        issue_valid: Optional[str] = Query(None),
+        roll: Optional[str] = Query(None),
+        from_date: str = Query(...),
+        to_date: str = Query(...),
+        db: Session = Depends(get_read_db)
+):
+    import analytics
+    pm = _analysis_matrix(db, branch, issue_valid, roll, from_date, to_date)
+    trend = analytics.trend(pm)
+    return {**trend, "meta": pm.meta()}
+
+
+@api.get("/attendance/analysis/branches")
+def attendance_analysis_branches(
+        issue_valid: Optional[str] = Query(None),
+        from_date: str = Query(...),
+        to_date: str = Query(...),
+        total_working_days: Optional[int] = Query(None),
+        db: Session = Depends(get_read_db)
+):
+    import analytics
+    pm = _analysis_matrix(db, None, issue_valid, None, from_date, to_date)
+    branches = analytics.branch_comparison(pm, total_working_days)
+    return {"branches": branches, "meta": pm.meta()}
+
+
+@api.get("/attendance/analysis/defaulters")
+def attendance_analysis_defaulters(
+        branch: Optional[str] = Query(None),
+        issue_valid: Optional[str] = Query(None),
+        from_date: str = Query(...),
+        to_date: str = Query(...),
+        threshold: float = Query(75.0),  # minimum required attendance %
+        total_working_days: Optional[int] = Query(None),
+        db: Session = Depends(get_read_db)
+):
+    import analytics
+    pm = _analysis_matrix(db, branch, issue_valid, None, from_date, to_date)
+    students = analytics.defaulters(pm, threshold, total_working_days)
+    return {"threshold": threshold, "students": students, "meta": pm.meta()}
+
+# -------------------------------attendance report (pdf / xlsx)------------------------
+@api.get("/attendance/report")
+async def attendance_report(
+        format: str = Query("pdf", pattern="^(pdf|xlsx)$"),
+        branch: Optional[str] = Query(None),
+        issue_valid: Optional[str] = Query(None),  # e.g., "2023-27"
+        from_date: str = Query(...),
+        to_date: str = Query(...),
+        db: Session = Depends(get_read_db)
+):
+    """
+    Download an attendance report for a branch / batch / date range.
+    Reports are built in a worker process and cached on disk until the data changes.
+    """
+    try:
+        from_dt = datetime.strptime(from_date, "%Y-%m-%d").date()
+        to_dt = datetime.strptime(to_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+    try:
+        version = await run_in_threadpool(reports.data_version, db, branch, issue_valid, from_dt, to_dt)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid issue_valid format")
+
+    path = reports.cache_path(format, branch, issue_valid, from_dt, to_dt, version)
+    path, cached = await reports.get_report(path, format, branch, issue_valid, from_dt, to_dt)
+    filename = f"attendance_{branch or 'all'}_{from_dt}_{to_dt}.{format}"
+    return FileResponse(
+        path,
+        media_type=reports.FORMATS[format],
+        filename=filename,
+        headers={"X-Report-Cache": "hit" if cached else "miss"},
+    )
 
-    analysis = []
-    for student in students:
-        present_count = db.query(func.count(Attendance.id)).filter(
-            Attendance.roll == student.roll,
-            Attendance.date >= start_dt,
-            Attendance.date <= end_dt,
-            Attendance.status == "Present"
-        ).scalar()
+# -------------------------------live counters for today------------------------
+@api.get("/attendance/live")
+async def attendance_live():
+    """Today's present / absent / unmarked counts per branch and batch (in-memory, no DB scan)."""
+    if live.day != date.today():
+        await run_in_threadpool(live.reconcile)
+    return live.snapshot()
 
-        percentage = round((present_count / total_working_days) * 100, 2) if total_working_days > 0 else 0
-        analysis.append({
-            "roll": student.roll,
-            "name": student.name,
-            "attendance_percentage": percentage
-        })
 
-    return analysis
+@api.get("/attendance/live/stream")
+async def attendance_live_stream(request: Request):
+    """
+    Server-sent events for dashboards: a `counts` event with the same body as
+    /attendance/live on connect and whenever the counts change (at most once
+    per LIVE_PUSH_INTERVAL), and a keep-alive comment when idle.
+    """
+    if live.day != date.today():
+        await run_in_threadpool(live.reconcile)
+
+    async def events():
+        async with aclosing(live.subscribe()) as frames:
+            async for frame in frames:
+                if await request.is_disconnected():
+                    break
+                yield frame
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ----------------- Secure Scheduled Tasks APIs -----------------
-@app.post("/tasks/mark-absent")
+# The jobs run on the in-process scheduler (scheduler.py / jobs.py); these
+# endpoints only queue a run so external cron can still trigger them.
+@api.post("/tasks/mark-absent", status_code=202)
 async def api_mark_absent_students(
     request: Request,
     mark_absent_api_key: str = Header(...),
-    db: Session = Depends(get_db)
 ):
-
     verify_api_key(mark_absent_api_key)
+    run_id = await run_in_threadpool(scheduler.trigger, "mark-absent")
+    return {"message": "Mark absent job queued", "run_id": run_id}
 
-    today = date.today()
-    students = db.query(Student).all()
-    for student in students:
-        record = db.query(Attendance).filter(Attendance.roll == student.roll, Attendance.date == today).first()
-        if not record:
-            absent_record = Attendance(roll=student.roll, date=today, status="Absent")
-            db.add(absent_record)
-    db.commit()
-
-    return {"message": "Absent students marked"}
 
-
-@app.post("/tasks/delete-expired-students")
+@api.post("/tasks/delete-expired-students", status_code=202)
 async def api_delete_expired_students(
         request: Request,
         mark_absent_api_key: str = Header(None),
-        db: Session = Depends(get_db)
 ):
-    # Verify API key
     verify_api_key(mark_absent_api_key)
+    run_id = await run_in_threadpool(scheduler.trigger, "delete-expired-students")
+    return {"message": "Delete expired students job queued", "run_id": run_id}
 
-    today = datetime.today()
-    deleted_count = 0
 
-    # Fetch students with valid issue_valid
-    students = db.query(Student).filter(Student.issue_valid != None).all()
-
-    for student in students:
-        try:
-            end_year_part = student.issue_valid.split("-")[1]
-            end_year = int(end_year_part)
-            if end_year < 100:
-                end_year += 2000
-
-            expire_date = datetime(end_year, 12, 31)
-
-            if today > expire_date:
-                # Delete student's attendance records
-                db.query(Attendance).filter(Attendance.roll == student.roll).delete()
-                # Delete student record
-                db.delete(student)
-                deleted_count += 1
-
-        except Exception as e:
-            print(f"Error deleting student {student.roll}: {e}")
-
-    db.commit()
-
-    return {"message": f"{deleted_count} expired students deleted"}
-
-
-@app.post("/tasks/cleanup-old-attendance")
+@api.post("/tasks/cleanup-old-attendance", status_code=202)
 async def api_cleanup_old_attendance(
     request: Request,
     mark_absent_api_key: str = Header(None),
-    db: Session = Depends(get_db)
 ):
     verify_api_key(mark_absent_api_key)
+    run_id = await run_in_threadpool(scheduler.trigger, "cleanup-old-attendance")
+    return {"message": "Cleanup old attendance job queued", "run_id": run_id}
 
-    today = datetime.today()
-    cutoff_date = today - timedelta(days=365)
-    deleted_count = db.query(Attendance).filter(Attendance.date < cutoff_date.date()).delete()
-    db.commit()
 
-    return {"message": f"{deleted_count} old attendance records deleted"}
+@api.get("/tasks/runs", response_model=list[JobRunOut])
+def api_job_runs(
+    name: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    mark_absent_api_key: str = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Recent job runs with duration, rows touched and errors (newest first)."""
+    verify_api_key(mark_absent_api_key)
+    return recent_runs(db, name, limit)
 
 # ----------------------------------------------------app relate feature --------------------------------
 router = APIRouter(prefix="/apk", tags=["apk"])
@@ -453,7 +611,7 @@ def get_current_student(credentials: HTTPAuthorizationCredentials = Depends(secu
     return roll
 
 @router.post("/login")
-def apk_login(data: StudentLogin, db: Session = Depends(get_db)):
+def apk_login(data: StudentLogin, request: Request, db: Session = Depends(get_db)):
     """
     Student login with JSON body { "roll": "...", "pin": "....", "device_id": "..." }
     Handles:
@@ -465,6 +623,9 @@ def apk_login(data: StudentLogin, db: Session = Depends(get_db)):
     pin = data.pin.strip()
     device_id = data.device_id.strip() if data.device_id else None
 
+    # Reject brute force / retry storms before any bcrypt work
+    ratelimit.check(request, "apk-login", identity=roll, device=device_id)
+
     # 1️⃣ Student existence check
     student = db.query(Student).filter(Student.roll == roll).first()
     if not student:
@@ -502,12 +663,23 @@ def apk_login(data: StudentLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/profile", response_model=StudentProfileOut)
-def apk_profile(roll: str = Depends(get_current_student), db: Session = Depends(get_db)):
+def apk_profile(
+    request: Request,
+    response: Response,
+    roll: str = Depends(get_current_student),
+    db: Session = Depends(get_db)
+):
     """
     Return the authenticated student's profile.
     Token must be set in Authorization header as Bearer <token>.
+    Supports If-None-Match / If-Modified-Since (304 when unchanged).
     """
     roll = roll.upper()
+    version, updated_at = versions.get_version(db, roll)
+    not_modified = versions.conditional(request, response, versions.make_etag("profile", roll, version), updated_at)
+    if not_modified:
+        return not_modified
+
     student = db.query(Student).filter(Student.roll == roll).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -534,6 +706,8 @@ def apk_photo(roll: str, db: Session = Depends(get_db)):
 
 @router.get("/attendance", response_model=List[AttendanceRecord])
 def apk_attendance(
+    request: Request,
+    response: Response,
     roll: str = Depends(get_current_student),
     start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
@@ -545,6 +719,7 @@ def apk_attendance(
     """
     Get attendance records for authenticated student.
     Defaults: last ~6 months if no dates provided.
+    Supports If-None-Match / If-Modified-Since (304 when unchanged).
     """
     # Parse default date range (last ~6 months)
     today = date.today()
@@ -556,12 +731,19 @@ def apk_attendance(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
 
+    # Answer revalidation from the version row alone, before the range query
+    version, updated_at = versions.get_version(db, roll.upper())
+    etag = versions.make_etag("attendance", roll.upper(), version, start_dt, end_dt, status, sort_by, sort_order)
+    not_modified = versions.conditional(request, response, etag, updated_at)
+    if not_modified:
+        return not_modified
+
     q = db.query(Attendance).filter(Attendance.roll == roll.upper(),
                                     Attendance.date >= start_dt,
                                     Attendance.date <= end_dt)
 
     if status:
-        q = q.filter(Attendance.status.ilike(f"%{status}%"))
+        q = q.filter(Attendance.status == status_filter(status))
 
     # Ordering
     order = (sort_order or "desc").lower()
@@ -585,8 +767,120 @@ def apk_attendance(
         ))
     return results
 
+@router.get("/summary", response_model=AttendanceSummaryOut)
+def apk_summary(
+    roll: str = Depends(get_current_student),
+    db: Session = Depends(get_db)
+):
+    """
+    Present/absent counts and percentages for this month, this term and all
+    time, plus the current streak of Present days. Read from precomputed
+    counters, so it costs one row lookup regardless of history length.
+    """
+    summary = summaries.get_summary(db, roll.upper())
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return summary
+
+SYNC_MAX_ITEMS = 500
+
+@router.post("/sync", response_model=SyncResponse)
+def apk_sync(
+    data: SyncRequest,
+    roll: str = Depends(get_current_student),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload the device's queue of pending attendance marks in one call.
+    Body: { "items": [ { "idempotency_key": "...", "date": "YYYY-MM-DD", "time": "HH:MM" }, ... ] }
+    Each item is validated with the same rules as /attendance/mark and gets its own result.
+    Re-sending an item with the same idempotency_key returns its original result.
+    """
+    roll = roll.upper()
+    if len(data.items) > SYNC_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SYNC_MAX_ITEMS} items per sync")
+    student = db.query(Student.branch, Student.issue_valid).filter(Student.roll == roll).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    today = date.today()
+    keys = {item.idempotency_key for item in data.items}
+    dates = {item.date for item in data.items}
+
+    # Two set-based reads: earlier receipts for these keys, and existing marks for these dates
+    receipts = {
+        r.idempotency_key: r
+        for r in db.query(SyncReceipt).filter(SyncReceipt.idempotency_key.in_(keys))
+    } if keys else {}
+    marked_dates = {
+        d for (d,) in db.query(Attendance.date).filter(Attendance.roll == roll, Attendance.date.in_(dates))
+    } if dates else set()
+
+    results = []
+    new_attendance = []
+    new_receipts = []
+    marked = []
+    seen = {}
+    now = datetime.utcnow()
+    for item in data.items:
+        key = item.idempotency_key
+        if key in receipts:
+            receipt = receipts[key]
+            if receipt.roll != roll:
+                results.append({"idempotency_key": key, "status": "rejected", "detail": "Idempotency key already used"})
+            else:
+                results.append({"idempotency_key": key, "status": receipt.result, "replayed": True})
+            continue
+        if key in seen:
+            results.append({**seen[key], "replayed": True})
+            continue
+        if not key or len(key) > 64:
+            result = {"idempotency_key": key, "status": "rejected", "detail": "Invalid idempotency key"}
+        elif item.date != today:
+            result = {"idempotency_key": key, "status": "rejected", "detail": "Invalid date"}
+        elif item.date in marked_dates:
+            result = {"idempotency_key": key, "status": "duplicate", "detail": "Attendance already marked"}
+        else:
+            result = {"idempotency_key": key, "status": "marked"}
+            marked.append(result)
+            marked_dates.add(item.date)
+            new_attendance.append({"roll": roll, "date": item.date, "time": item.time, "status": "Present"})
+        if result["status"] != "rejected":
+            new_receipts.append({"idempotency_key": key, "roll": roll, "date": item.date,
+                                 "result": result["status"], "created_at": now})
+        seen[key] = result
+        results.append(result)
+
+    # One multi-row INSERT per table, in a single transaction
+    try:
+        if new_attendance:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(Attendance), new_attendance)
+            except IntegrityError:
+                # Marked between the read above and this insert (the unique
+                # roll + date index): report it like any other duplicate
+                for result in marked:
+                    result.update(status="duplicate", detail="Attendance already marked")
+                for receipt in new_receipts:
+                    if receipt["result"] == "marked":
+                        receipt["result"] = "duplicate"
+                new_attendance = []
+        if new_attendance:
+            summaries.record(db, roll, today, "Present")  # at most one new mark (today)
+        if new_receipts:
+            db.execute(insert(SyncReceipt), new_receipts)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Sync already in progress for these items, retry")
+    if new_attendance:
+        live.record(student.branch, student.issue_valid, "Present", today)
+
+    return {"results": results}
+
 @router.post("/forgot-pin")
-def apk_forgot_pin(data: ForgotPinRequest = Body(...), db: Session = Depends(get_db)):
+def apk_forgot_pin(request: Request, data: ForgotPinRequest = Body(...), db: Session = Depends(get_db)):
     """
     Reset PIN after verifying DOB.
     Body: { "roll": "...", "dob": "YYYY-MM-DD", "new_pin": "1234" }
@@ -595,6 +889,8 @@ def apk_forgot_pin(data: ForgotPinRequest = Body(...), db: Session = Depends(get
     dob_str = data.dob.strip()
     new_pin = data.new_pin.strip()
 
+    ratelimit.check(request, "apk-forgot-pin", identity=roll)
+
     student = db.query(Student).filter(Student.roll == roll).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -616,14 +912,68 @@ def apk_forgot_pin(data: ForgotPinRequest = Body(...), db: Session = Depends(get
     db.commit()
     return {"message": "PIN reset successful"}
 
-# Include router into your main app
-# If you are editing main.py where `app` is defined, run:
-app.include_router(router)
+# ----------------- Rate limit metrics -----------------
+@api.get("/metrics/limits")
+def rate_limit_metrics():
+    return ratelimit.snapshot()
+
+@api.get("/metrics/live")
+def live_metrics():
+    return {"subscribers": live.subscribers, "version": live.version, "day": live.day,
+            "reconciled_at": live.reconciled_at}
+
+@api.get("/metrics/replica")
+def read_replica_metrics():
+    return replica_status()
+
 # ----------------- Root -----------------
-@app.get("/")
+@api.get("/")
 def read_root():
     return {"message": "College Admin Backend running."}
 
 
 # ----------------- Database Setup -----------------
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+def init_db():
+    engine = get_engine()
+    partitions.init_partitioned_table(engine)  # no-op unless Postgres + ATTENDANCE_PARTITIONING
+    Base.metadata.create_all(bind=engine)
+    migrated = attendance_types.migrate(engine)  # text status/time -> SMALLINT/TIME, once
+    if migrated:
+        print(attendance_types.describe(migrated))
+    attendance_types.ensure_indexes(engine)
+    search.install_search_index(engine)
+    versions.install_version_triggers(engine)
+
+
+# ----------------- App factory -----------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: schema. Cloudinary, bcrypt, jose and numpy stay unloaded until
+    # a request needs them.
+    if os.getenv("SKIP_DB_INIT", "").lower() not in ("1", "true", "yes"):
+        await run_in_threadpool(init_db)
+    if os.getenv("SCHEDULER_ENABLED", "1").lower() not in ("0", "false", "no"):
+        scheduler.start()
+    live.start()
+    yield
+    await live.stop()
+    scheduler.stop()
+    reports.shutdown()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="College Admin Backend", lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(querylog.RequestScopeMiddleware)
+    app.include_router(api)
+    app.include_router(router)
+    return app
+
+
+app = create_app()
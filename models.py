@@ -1,7 +1,8 @@
 # models.py
-from sqlalchemy import Column, String, Integer, Date, Boolean, ForeignKey, CHAR,Text
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime, Boolean, ForeignKey, CHAR,Text, Index
 from sqlalchemy.orm import relationship
 from database import Base
+from attendance_types import AttendanceStatus, ClockTime
 
 
 class Admin(Base):
@@ -33,11 +34,81 @@ class Student(Base):
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # One mark per student per day; also serves per-student date lookups
+        Index("ix_attendance_roll_date", "roll", "date", unique=True),
+        # Date ranges (lists, reports, today's counts) with the status checked inside the index
+        Index("ix_attendance_date_status", "date", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     roll = Column(String(20), ForeignKey("students.roll"), index=True)  # Added index
     date = Column(Date, nullable=False)
-    time = Column(String(20), nullable=False)
-    status = Column(String(10), nullable=False)
+    time = Column(ClockTime)  # "HH:MM" in Python, TIME in the DB; "" / NULL when not recorded
+    status = Column(AttendanceStatus, nullable=False)  # "Present" / "Absent", stored as 1 / 0
 
-    student = relationship("Student", back_populates="attendances")
\ No newline at end of file
+    student = relationship("Student", back_populates="attendances")
+
+
+class SyncReceipt(Base):
+    """Outcome of an offline-sync item, so retried batches are idempotent."""
+    __tablename__ = "sync_receipts"
+
+    idempotency_key = Column(String(64), primary_key=True)
+    roll = Column(String(20), ForeignKey("students.roll"), index=True, nullable=False)
+    date = Column(Date, nullable=False)
+    result = Column(String(20), nullable=False)  # "marked" / "duplicate"
+    created_at = Column(DateTime, nullable=False)
+
+
+class StudentVersion(Base):
+    """Bumped by DB triggers on any students / attendance change for the roll (see versions.py)."""
+    __tablename__ = "student_versions"
+
+    roll = Column(String(20), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime)
+
+
+class JobLease(Base):
+    """Leader-election lease: the instance whose lease is unexpired runs the job."""
+    __tablename__ = "job_leases"
+
+    name = Column(String(50), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    acquired_at = Column(DateTime)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class JobRun(Base):
+    """One run of a maintenance job (scheduled or triggered over HTTP)."""
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False, index=True)
+    trigger = Column(String(20), nullable=False)  # "schedule" / "http"
+    owner = Column(String(100))
+    status = Column(String(20), nullable=False)  # queued / running / succeeded / failed / skipped
+    queued_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Float)
+    rows = Column(Integer)
+    error = Column(Text)
+
+
+class AttendanceSummary(Base):
+    """Per-student present/absent counters for /apk/summary (kept by summaries.py)."""
+    __tablename__ = "attendance_summaries"
+
+    roll = Column(String(20), ForeignKey("students.roll"), primary_key=True)
+    month_start = Column(Date, nullable=False)
+    month_present = Column(Integer, nullable=False, default=0)
+    month_absent = Column(Integer, nullable=False, default=0)
+    term_start = Column(Date, nullable=False)
+    term_present = Column(Integer, nullable=False, default=0)
+    term_absent = Column(Integer, nullable=False, default=0)
+    total_present = Column(Integer, nullable=False, default=0)
+    total_absent = Column(Integer, nullable=False, default=0)
+    streak = Column(Integer, nullable=False, default=0)  # consecutive Present marks up to last_date
+    last_date = Column(Date)
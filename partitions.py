@@ -0,0 +1,242 @@
+# partitions.py
+"""
+Monthly range partitioning of `attendance` (Postgres only, opt-in).
+
+Set ATTENDANCE_PARTITIONING=1 to have a fresh database create `attendance` as
+a table partitioned by month on `date`. Partitions are named
+attendance_pYYYY_MM and created PARTITION_MONTHS_AHEAD months in advance.
+Retention detaches and drops whole partitions instead of deleting rows.
+Every query that filters on Attendance.date is pruned to the matching months.
+
+On SQLite (or with the flag off) everything here is a no-op and the plain
+table from models.py is used.
+
+CLI:
+    python partitions.py status
+    python partitions.py ensure            # create upcoming partitions
+    python partitions.py migrate           # convert an existing plain table
+    python partitions.py drop-before YYYY-MM-DD
+"""
+import os
+import re
+import sys
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_NAME = re.compile(r"^attendance_p(\d{4})_(\d{2})$")
+# DETACH needs an exclusive lock on `attendance`; waiting for it behind a long
+# report would queue every mark behind the retention job. Give up instead.
+DETACH_LOCK_TIMEOUT = "5s"
+
+CREATE_PARENT = """
+CREATE TABLE attendance (
+    id INTEGER NOT NULL DEFAULT nextval('attendance_id_seq'),
+    roll VARCHAR(20) REFERENCES students (roll),
+    date DATE NOT NULL,
+    time TIME,
+    status SMALLINT NOT NULL,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date)
+"""
+
+PARENT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_attendance_id ON attendance (id)",
+    "CREATE INDEX IF NOT EXISTS ix_attendance_roll ON attendance (roll)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_attendance_roll_date ON attendance (roll, date)",
+    "CREATE INDEX IF NOT EXISTS ix_attendance_date_status ON attendance (date, status)",
+]
+
+
+def enabled(engine: Engine) -> bool:
+    return (
+        engine.dialect.name == "postgresql"
+        and os.getenv("ATTENDANCE_PARTITIONING", "").lower() in ("1", "true", "yes")
+    )
+
+
+def partitioned(engine: Engine) -> bool:
+    """True when partitioning is enabled and `attendance` actually is partitioned."""
+    if not enabled(engine):
+        return False
+    with engine.connect() as conn:
+        return is_partitioned(conn)
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _add_months(d: date, months: int) -> date:
+    y, m = divmod(d.month - 1 + months, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"attendance_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(conn) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'attendance' AND pg_table_is_visible(c.oid)"
+    )).first())
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def list_partitions(conn) -> list[tuple[str, date]]:
+    """(partition name, first day of its month), oldest first."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'attendance'"
+    )).scalars()
+    parts = []
+    for name in names:
+        m = PARTITION_NAME.match(name)
+        if m:
+            parts.append((name, date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(parts, key=lambda p: p[1])
+
+
+def _create_partition(conn, month: date):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF attendance "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    ))
+
+
+def _create_parent(conn):
+    conn.execute(text("CREATE SEQUENCE IF NOT EXISTS attendance_id_seq"))
+    conn.execute(text(CREATE_PARENT))
+    conn.execute(text("ALTER SEQUENCE attendance_id_seq OWNED BY attendance.id"))
+    for ddl in PARENT_INDEXES:
+        conn.execute(text(ddl))
+
+
+def ensure_partitions(engine: Engine, start: date | None = None, months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    """Create monthly partitions from `start` (default: last month) to months_ahead from now."""
+    if not enabled(engine):
+        return 0
+    first = _month_start(start or _add_months(date.today(), -1))
+    last = _add_months(_month_start(date.today()), months_ahead)
+    created = 0
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return 0
+        existing = {name for name, _ in list_partitions(conn)}
+        month = first
+        while month <= last:
+            if partition_name(month) not in existing:
+                _create_partition(conn, month)
+                created += 1
+            month = _add_months(month, 1)
+    return created
+
+
+def init_partitioned_table(engine: Engine):
+    """
+    Create `attendance` as a partitioned table if it does not exist yet.
+    Must run before Base.metadata.create_all, which then leaves it alone.
+    """
+    if not enabled(engine):
+        return
+    with engine.begin() as conn:
+        if not _table_exists(conn, "students"):
+            from models import Student
+            Student.__table__.create(conn)
+        if not _table_exists(conn, "attendance"):
+            _create_parent(conn)
+    ensure_partitions(engine)
+
+
+def migrate_to_partitioned(engine: Engine):
+    """One-off conversion of an existing plain `attendance` table (copies every row)."""
+    if not enabled(engine):
+        raise RuntimeError("Partitioning needs Postgres and ATTENDANCE_PARTITIONING=1")
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return
+        bounds = conn.execute(text("SELECT min(date), max(date) FROM attendance")).one()
+        conn.execute(text("ALTER TABLE attendance RENAME TO attendance_unpartitioned"))
+        conn.execute(text("ALTER SEQUENCE IF EXISTS attendance_id_seq OWNED BY NONE"))
+        for ddl in PARENT_INDEXES:
+            index_name = ddl.split(" ON ")[0].split()[-1]
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        _create_parent(conn)
+        if bounds[0] is not None:
+            month = _month_start(bounds[0])
+            while month <= _month_start(bounds[1]):
+                _create_partition(conn, month)
+                month = _add_months(month, 1)
+        conn.execute(text(
+            "INSERT INTO attendance (id, roll, date, time, status) "
+            "SELECT id, roll, date, time, status FROM attendance_unpartitioned"
+        ))
+        conn.execute(text("SELECT setval('attendance_id_seq', COALESCE((SELECT max(id) FROM attendance), 1))"))
+        conn.execute(text("DROP TABLE attendance_unpartitioned"))
+    ensure_partitions(engine)
+
+
+def drop_before(engine: Engine, cutoff: date) -> int:
+    """
+    Remove attendance older than `cutoff`: whole months are detached and
+    dropped, only the month containing the cutoff is trimmed with DELETE.
+    Returns the number of rows removed.
+    """
+    removed = 0
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+        for name, month in list_partitions(conn):
+            if _add_months(month, 1) <= cutoff:
+                removed += conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+                conn.execute(text(f"ALTER TABLE attendance DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+        # Partition pruning limits this to the month containing the cutoff
+        removed += conn.execute(text("DELETE FROM attendance WHERE date < :cutoff"), {"cutoff": cutoff}).rowcount
+    return removed
+
+
+def status(engine: Engine) -> dict:
+    if not enabled(engine):
+        return {"enabled": False}
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return {"enabled": True, "partitioned": False}
+        return {
+            "enabled": True,
+            "partitioned": True,
+            "partitions": [{"name": name, "month": str(month)} for name, month in list_partitions(conn)],
+        }
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    engine = get_engine()
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "status":
+        print(status(engine))
+    elif command == "ensure":
+        print(f"{ensure_partitions(engine)} partitions created")
+    elif command == "migrate":
+        import attendance_types
+        import versions
+        from database import Base
+
+        attendance_types.migrate(engine)  # the partitioned parent has the typed columns
+        attendance_types.ensure_indexes(engine)  # drops duplicate marks the unique index would reject
+        migrate_to_partitioned(engine)
+        Base.metadata.create_all(bind=engine)  # student_versions and friends on an older database
+        versions.install_version_triggers(engine)
+        print(status(engine))
+    elif command == "drop-before":
+        print(f"{drop_before(engine, date.fromisoformat(sys.argv[2]))} rows removed")
+    else:
+        sys.exit(f"Unknown command {command!r}")
@@ -0,0 +1,299 @@
+# querylog.py
+"""
+Slow-query log with EXPLAIN capture.
+
+Every engine created in database.py is instrumented: a statement that takes
+longer than SLOW_QUERY_MS is written as one JSON line to a rotating log with
+its SQL, redacted parameters, the route and code location that issued it, and
+the database's plan (EXPLAIN on Postgres, EXPLAIN QUERY PLAN on SQLite).
+
+Env:
+    SLOW_QUERY_MS=250                 threshold; -1 disables the log
+    SLOW_QUERY_LOG_PATH=logs/slow_queries.log
+    SLOW_QUERY_LOG_MAX_MB=10          size of each file before rotating
+    SLOW_QUERY_LOG_BACKUPS=5
+    SLOW_QUERY_EXPLAIN_ANALYZE=0      1: EXPLAIN ANALYZE (re-runs the SELECT)
+    SLOW_QUERY_EXPLAIN_INTERVAL=300   explain each query shape at most this often (s)
+
+CLI:
+    python querylog.py summary [--top N] [--plans] [LOG_PATH]
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG_PATH = os.getenv("SLOW_QUERY_LOG_PATH", os.path.join(HERE, "logs", "slow_queries.log"))
+SLOW_QUERY_LOG_MAX_MB = float(os.getenv("SLOW_QUERY_LOG_MAX_MB", "10"))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+
+_request_scope: contextvars.ContextVar[dict | None] = contextvars.ContextVar("slow_query_scope", default=None)
+_logger: logging.Logger | None = None
+_last_explained: dict[str, float] = {}
+
+
+def explain_analyze() -> bool:
+    # Read on every slow query so it can be switched on without a restart
+    return os.getenv("SLOW_QUERY_EXPLAIN_ANALYZE", "").lower() in ("1", "true", "yes")
+
+
+# ----------------- Query shapes -----------------
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s|\?")
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def shape(statement: str) -> str:
+    """Statement with literals and parameters replaced by ?, so equal queries group together."""
+    s = _STRING.sub("?", statement)
+    s = _PARAM.sub("?", s)
+    s = _NUMBER.sub("?", s)
+    s = _IN_LIST.sub("(...)", s)
+    return _SPACE.sub(" ", s).strip()
+
+
+def shape_id(shaped: str) -> str:
+    return hashlib.sha1(shaped.encode()).hexdigest()[:10]
+
+
+# ----------------- Redaction -----------------
+def _redact_value(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(value)}>"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()  # dates and times say nothing about a student
+    return f"<{type(value).__name__}:{len(str(value))}>"
+
+
+def redact(parameters):
+    """Keep numbers, dates and NULLs; replace strings (names, PINs, tokens) by their length."""
+    if isinstance(parameters, dict):
+        return {k: redact(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(v) for v in parameters]
+    return _redact_value(parameters)
+
+
+# ----------------- Context -----------------
+class RequestScopeMiddleware:
+    """Remembers the ASGI scope of the current request so slow queries can name their route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+def _route() -> str | None:
+    scope = _request_scope.get()
+    if scope is None:
+        return None
+    # The router stores the matched route in the same scope dict once it has matched
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+def _caller() -> str | None:
+    """Innermost frame of this app's own code (main.py, crud.py, jobs.py, ...)."""
+    for frame in reversed(traceback.extract_stack()):
+        path = frame.filename
+        if path.startswith(HERE) and "site-packages" not in path and not path.endswith("querylog.py"):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    return None
+
+
+# ----------------- Plans -----------------
+def _explain(conn, statement: str, parameters, analyze: bool) -> list[str] | None:
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    # Raw DBAPI cursor: keeps the explain out of SQLAlchemy events and the ORM
+    # session, and reuses the exact parameters of the slow statement.
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if dialect == "postgresql":
+            cursor.execute("SAVEPOINT slow_query_explain")  # a failed EXPLAIN must not abort the transaction
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as e:
+            if dialect == "postgresql":
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return [f"EXPLAIN failed: {type(e).__name__}: {e}"]
+        if dialect == "postgresql":
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return [row[0] for row in rows]
+        return [str(row[-1]) for row in rows]  # (id, parent, notused, detail)
+    finally:
+        cursor.close()
+
+
+def _should_explain(sid: str) -> bool:
+    now = time.monotonic()
+    if now - _last_explained.get(sid, float("-inf")) < SLOW_QUERY_EXPLAIN_INTERVAL:
+        return False
+    _last_explained[sid] = now
+    return True
+
+
+# ----------------- Log -----------------
+def get_logger() -> logging.Logger:
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG_PATH), exist_ok=True)
+        logger = logging.getLogger("slow_query")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(
+            SLOW_QUERY_LOG_PATH,
+            maxBytes=int(SLOW_QUERY_LOG_MAX_MB * 1024 * 1024),
+            backupCount=SLOW_QUERY_LOG_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["slow_query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("slow_query_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    try:
+        shaped = shape(statement)
+        sid = shape_id(shaped)
+        plan = None
+        if not executemany and _should_explain(sid):
+            is_select = statement.lstrip().upper().startswith(("SELECT", "WITH"))
+            plan = _explain(conn, statement, parameters, analyze=explain_analyze() and is_select)
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "ms": round(elapsed_ms, 1),
+            "shape_id": sid,
+            "route": _route(),
+            "caller": _caller(),
+            "db": conn.engine.url.render_as_string(hide_password=True).split("@")[-1],
+            "rows": cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None,
+            "sql": statement,
+            "params": (redact(parameters[:5]) + ["..."]) if executemany and len(parameters) > 5 else redact(parameters),
+            "plan": plan,
+        }
+        get_logger().info(json.dumps(entry, default=str))
+    except Exception as e:
+        print(f"Slow query log failed: {e}")
+
+
+def install(engine):
+    """Attach the slow-query listeners to `engine` (no-op when SLOW_QUERY_MS < 0)."""
+    if SLOW_QUERY_MS < 0 or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ----------------- CLI -----------------
+def read_entries(path: str):
+    """Entries from the log and its rotated backups, oldest file first."""
+    paths = [f"{path}.{i}" for i in range(SLOW_QUERY_LOG_BACKUPS, 0, -1)] + [path]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries) -> list[dict]:
+    """Group entries by query shape, worst total time first."""
+    groups: dict[str, dict] = {}
+    for e in entries:
+        g = groups.get(e["shape_id"])
+        if g is None:
+            g = groups[e["shape_id"]] = {
+                "shape_id": e["shape_id"], "shape": shape(e["sql"]), "count": 0, "total_ms": 0.0,
+                "max_ms": 0.0, "routes": {}, "plan": None, "last_seen": e["ts"],
+            }
+        g["count"] += 1
+        g["total_ms"] += e["ms"]
+        g["last_seen"] = max(g["last_seen"], e["ts"])
+        route = e.get("route") or e.get("caller") or "-"
+        g["routes"][route] = g["routes"].get(route, 0) + 1
+        if e["ms"] >= g["max_ms"]:
+            g["max_ms"] = e["ms"]
+        if e.get("plan"):
+            g["plan"] = e["plan"]  # most recent plan wins
+    for g in groups.values():
+        g["mean_ms"] = g["total_ms"] / g["count"]
+    return sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+
+
+def _print_summary(groups: list[dict], top: int, plans: bool):
+    if not groups:
+        print("No slow queries logged.")
+        return
+    print(f"{'shape':<10} {'count':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9}  top route")
+    for g in groups[:top]:
+        route, hits = max(g["routes"].items(), key=lambda r: r[1])
+        print(f"{g['shape_id']:<10} {g['count']:>6} {g['total_ms']:>10.0f} {g['mean_ms']:>9.1f} "
+              f"{g['max_ms']:>9.1f}  {route} ({hits})")
+        print(f"    {g['shape'][:300]}")
+        if plans and g["plan"]:
+            for line in g["plan"]:
+                print(f"      | {line}")
+        print()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    command = args.pop(0) if args else "summary"
+    if command != "summary":
+        sys.exit(f"Unknown command {command!r}")
+    top, show_plans, path = 10, False, SLOW_QUERY_LOG_PATH
+    while args:
+        arg = args.pop(0)
+        if arg == "--top":
+            top = int(args.pop(0))
+        elif arg == "--plans":
+            show_plans = True
+        else:
+            path = arg
+    _print_summary(summarize(read_entries(path)), top, show_plans)
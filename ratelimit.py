@@ -0,0 +1,223 @@
+# ratelimit.py
+"""
+Cheap request rejection for the bcrypt-heavy endpoints.
+
+- Token buckets keyed by identity (roll / user id), client IP and device id
+  reject brute-force and retry storms before any hashing is done.
+- A global cap on concurrent bcrypt operations answers 503 + Retry-After
+  instead of letting hashes queue up and starve the other endpoints.
+
+Bucket state lives in a pluggable backend: in-process by default, or Redis
+(RATE_LIMIT_REDIS_URL) so several app instances share the same limits.
+
+The IP bucket is deliberately loose: a campus NAT or a reverse proxy puts many
+students behind one address, and the identity and device buckets already stop
+guessing against a single account. Behind a proxy, list it in TRUSTED_PROXIES
+(IPs or CIDRs, comma-separated) so the client address is taken from
+X-Forwarded-For.
+"""
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from fastapi import HTTPException, Request
+
+
+# (tokens per minute, burst) for each bucket scope
+RULES = {
+    "identity": (int(os.getenv("RATE_LIMIT_IDENTITY_PER_MIN", "5")), int(os.getenv("RATE_LIMIT_IDENTITY_BURST", "5"))),
+    "ip": (int(os.getenv("RATE_LIMIT_IP_PER_MIN", "600")), int(os.getenv("RATE_LIMIT_IP_BURST", "120"))),
+    "device": (int(os.getenv("RATE_LIMIT_DEVICE_PER_MIN", "10")), int(os.getenv("RATE_LIMIT_DEVICE_BURST", "10"))),
+}
+
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+MAX_CONCURRENT_HASHES = int(os.getenv("MAX_CONCURRENT_HASHES", str(os.cpu_count() or 2)))
+HASH_WAIT_SECONDS = float(os.getenv("HASH_WAIT_SECONDS", "0.2"))
+HASH_RETRY_AFTER = 1
+
+
+# ----------------- Backends -----------------
+class MemoryBackend:
+    """Token buckets in this process only."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key: str, per_minute: int, burst: int) -> float:
+        """Take one token. Returns 0 if allowed, else seconds until a token is available."""
+        rate = per_minute / 60.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._evict(now)
+            return (1 - tokens) / rate if rate > 0 else 60.0
+
+    def _evict(self, now: float):
+        # Buckets untouched for 10 minutes are full again; forget them.
+        stale = [k for k, (_, last) in self._buckets.items() if now - last > 600]
+        for k in stale:
+            del self._buckets[k]
+
+
+class RedisBackend:
+    """Token buckets shared by every instance through Redis."""
+
+    SCRIPT = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or ARGV[2])
+    local last = tonumber(redis.call('HGET', KEYS[1], 'ts') or ARGV[3])
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    tokens = math.min(burst, tokens + (now - last) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], 600)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key: str, per_minute: int, burst: int) -> float:
+        return float(self._script(keys=[f"rl:{key}"], args=[per_minute / 60.0, burst, time.time()]))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = os.getenv("RATE_LIMIT_REDIS_URL")
+                _backend = RedisBackend(url) if url else MemoryBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the bucket store (any object with take(key, per_minute, burst) -> wait seconds)."""
+    global _backend
+    _backend = backend
+
+
+# ----------------- Metrics -----------------
+metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _metrics_lock:
+        metrics[name] += 1
+
+
+def snapshot() -> dict:
+    with _metrics_lock:
+        data = dict(metrics)
+        data["hashing_in_flight"] = _hashing_in_flight
+    data["hashing_capacity"] = MAX_CONCURRENT_HASHES
+    return data
+
+
+# ----------------- Request limiting -----------------
+def _trusted(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """
+    The peer address, or when the peer is a trusted proxy, the right-most
+    X-Forwarded-For hop that is not itself a trusted proxy. Hops further left
+    are set by the client and cannot be trusted.
+    """
+    host = request.client.host if request.client else "unknown"
+    if not TRUSTED_PROXIES or not _trusted(host):
+        return host
+    hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else host
+
+
+def check(request: Request, endpoint: str, identity: str | None = None, device: str | None = None):
+    """
+    Charge one token from each bucket that applies to this request.
+    Raises 429 with Retry-After when any of them is empty.
+    """
+    scopes = [("ip", client_ip(request))]
+    if identity:
+        scopes.append(("identity", identity.strip().lower()))
+    if device:
+        scopes.append(("device", device.strip()))
+
+    backend = get_backend()
+    wait = 0.0
+    for scope, value in scopes:
+        per_minute, burst = RULES[scope]
+        wait = max(wait, backend.take(f"{endpoint}:{scope}:{value}", per_minute, burst))
+        if wait:
+            _count(f"{endpoint}.rejected.{scope}")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+    _count(f"{endpoint}.allowed")
+
+
+# ----------------- Hashing concurrency cap -----------------
+_hash_slots = threading.BoundedSemaphore(MAX_CONCURRENT_HASHES)
+_hashing_in_flight = 0
+
+
+def _track_hashing(delta: int):
+    global _hashing_in_flight
+    with _metrics_lock:
+        _hashing_in_flight += delta
+        if delta > 0:
+            metrics["hashing.started"] += 1
+            metrics["hashing.peak"] = max(metrics["hashing.peak"], _hashing_in_flight)
+
+
+@contextmanager
+def hashing_slot():
+    """Hold one of MAX_CONCURRENT_HASHES bcrypt slots, or fail fast with 503."""
+    if not _hash_slots.acquire(timeout=HASH_WAIT_SECONDS):
+        _count("hashing.rejected")
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, try again shortly",
+            headers={"Retry-After": str(HASH_RETRY_AFTER)},
+        )
+    _track_hashing(1)
+    try:
+        yield
+    finally:
+        _track_hashing(-1)
+        _hash_slots.release()
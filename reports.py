@@ -0,0 +1,225 @@
+# reports.py
+"""
+Server-side attendance reports (PDF / XLSX).
+
+Reports are built in a process pool so API workers are never blocked. Rows
+are read from a streaming cursor and written page by page / row by row to a
+temporary file, which is then moved into a local disk cache keyed by the
+filter and the current data version. Repeat downloads are served from disk.
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from models import Student, Attendance, StudentVersion
+from schemas import AttendancePdfOut
+
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(os.path.dirname(__file__), "report_cache"))
+REPORT_CACHE_MAX_MB = int(os.getenv("REPORT_CACHE_MAX_MB", "500"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_BATCH_SIZE = 2000
+
+FORMATS = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+COLUMNS = list(AttendancePdfOut.model_fields)
+
+_executor: ProcessPoolExecutor | None = None
+_in_flight: dict[str, asyncio.Future] = {}
+
+
+def _filtered(stmt, branch, issue_valid, from_dt, to_dt):
+    stmt = stmt.where(Attendance.date >= from_dt, Attendance.date <= to_dt)
+    if branch:
+        stmt = stmt.where(Student.branch == branch)
+    if issue_valid:
+        start_filter, end_filter = map(int, issue_valid.split("-"))
+        stmt = stmt.where(Student.issue_valid.ilike(f"{start_filter}-%"))
+    return stmt
+
+
+def data_version(db: Session, branch: str | None, issue_valid: str | None, from_dt: date, to_dt: date) -> str:
+    """
+    Cheap fingerprint of the rows a report would contain. The student
+    versions cover edits to a student's name or branch, which change the
+    report without touching its attendance rows.
+    """
+    stmt = _filtered(
+        select(
+            func.count(Attendance.id), func.max(Attendance.id), func.count(func.distinct(Student.roll)),
+            # Summed per attendance row: any included student's bump raises the total
+            func.sum(StudentVersion.version), func.max(StudentVersion.updated_at),
+        )
+        .select_from(Attendance).join(Student, Student.roll == Attendance.roll)
+        .outerjoin(StudentVersion, StudentVersion.roll == Student.roll),
+        branch, issue_valid, from_dt, to_dt,
+    )
+    count, max_id, students, versions, updated_at = db.execute(stmt).one()
+    return f"{count}:{max_id}:{students}:{versions}:{updated_at}"
+
+
+def cache_path(fmt: str, branch, issue_valid, from_dt: date, to_dt: date, version: str) -> str:
+    key = json.dumps([fmt, branch, issue_valid, str(from_dt), str(to_dt), version])
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    return os.path.join(REPORT_CACHE_DIR, f"{digest}.{fmt}")
+
+
+def _iter_rows(db: Session, branch, issue_valid, from_dt, to_dt):
+    stmt = _filtered(
+        select(Attendance.roll, Student.name, Student.branch, Attendance.date, Attendance.time, Attendance.status)
+        .join(Student, Student.roll == Attendance.roll),
+        branch, issue_valid, from_dt, to_dt,
+    ).order_by(Attendance.date, Attendance.roll)
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=REPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+
+def _title(branch, issue_valid, from_dt, to_dt) -> str:
+    parts = ["Attendance report", f"{from_dt} to {to_dt}"]
+    if branch:
+        parts.append(f"branch {branch}")
+    if issue_valid:
+        parts.append(f"batch {issue_valid}")
+    return " - ".join(parts)
+
+
+def _write_xlsx(path: str, title: str, rows) -> int:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)  # rows are flushed to disk as they are appended
+    ws = wb.create_sheet("Attendance")
+    ws.append([title])
+    ws.append(COLUMNS)
+    count = 0
+    for row in rows:
+        ws.append(list(row))
+        count += 1
+    wb.save(path)
+    return count
+
+
+def _write_pdf(path: str, title: str, rows) -> int:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    width, height = A4
+    margin, line = 36, 14
+    col_x = [margin, margin + 70, margin + 220, margin + 300, margin + 380, margin + 450]
+
+    pdf = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+    page = 0
+
+    def header():
+        nonlocal page
+        page += 1
+        pdf.setFont("Helvetica-Bold", 11)
+        pdf.drawString(margin, height - margin, title)
+        pdf.setFont("Helvetica", 8)
+        pdf.drawRightString(width - margin, height - margin, f"Page {page}")
+        pdf.setFont("Helvetica-Bold", 9)
+        for x, name in zip(col_x, COLUMNS):
+            pdf.drawString(x, height - margin - 2 * line, name.title())
+        pdf.setFont("Helvetica", 9)
+        return height - margin - 3 * line
+
+    y = header()
+    count = 0
+    for row in rows:
+        if y < margin:
+            pdf.showPage()
+            y = header()
+        for x, value in zip(col_x, row):
+            pdf.drawString(x, y, "" if value is None else str(value)[:30])
+        y -= line
+        count += 1
+    pdf.save()
+    return count
+
+
+def build_report(fmt: str, branch, issue_valid, from_dt: date, to_dt: date, path: str) -> str:
+    """Generate a report into the cache. Runs inside a worker process."""
+    from database import ReadSessionLocal
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=f".{fmt}.part")
+    os.close(fd)
+    db = ReadSessionLocal()
+    try:
+        rows = _iter_rows(db, branch, issue_valid, from_dt, to_dt)
+        title = _title(branch, issue_valid, from_dt, to_dt)
+        if fmt == "xlsx":
+            _write_xlsx(tmp_path, title, rows)
+        else:
+            _write_pdf(tmp_path, title, rows)
+        os.replace(tmp_path, path)  # atomic: readers never see a partial report
+    finally:
+        db.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Spawned, not forked: a fork of this multithreaded server would copy
+        # held locks and share the parent's pooled database connections.
+        _executor = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def prune_cache():
+    """Drop least recently used reports once the cache exceeds REPORT_CACHE_MAX_MB."""
+    if not os.path.isdir(REPORT_CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(REPORT_CACHE_DIR):
+        if name.endswith(".part"):
+            continue
+        full = os.path.join(REPORT_CACHE_DIR, name)
+        st = os.stat(full)
+        entries.append((st.st_atime, st.st_size, full))
+    total = sum(size for _, size, _ in entries)
+    limit = REPORT_CACHE_MAX_MB * 1024 * 1024
+    for _, size, full in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(full)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+async def get_report(path: str, fmt: str, branch, issue_valid, from_dt: date, to_dt: date) -> tuple[str, bool]:
+    """Return (path, cached). Concurrent requests for the same report share one build."""
+    if os.path.exists(path):
+        os.utime(path)
+        return path, True
+    future = _in_flight.get(path)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_get_executor(), build_report, fmt, branch, issue_valid, from_dt, to_dt, path)
+        _in_flight[path] = future
+        future.add_done_callback(lambda _: _in_flight.pop(path, None))
+    await asyncio.shield(future)
+    prune_cache()
+    return path, False
@@ -0,0 +1,265 @@
+# scheduler.py
+"""
+In-process scheduler for the maintenance jobs.
+
+A single background thread per app instance runs the daily jobs at their
+configured local time and any runs triggered over HTTP. Before running a
+job the instance takes a lease row in job_leases, so when N instances are
+up only one of them runs each job. Every run is recorded in job_runs with
+its duration, rows touched and error.
+
+Env:
+    SCHEDULER_ENABLED=0           only run HTTP-triggered jobs, no daily schedule
+    JOB_MARK_ABSENT_AT=17:30      local time of each daily run (HH:MM)
+    JOB_MARK_ABSENT_DAYS=mon-fri  weekdays it runs on: ranges and/or lists
+                                  ("mon-sat", "mon,wed,fri") or "daily"
+    JOB_DELETE_EXPIRED_AT=02:00
+    JOB_CLEANUP_ATTENDANCE_AT=03:00
+    JOB_LEASE_SECONDS=1800
+
+The schedule knows weekdays, not holidays: on a holiday that falls on a
+scheduled weekday, mark-absent still runs.
+"""
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import update, or_, and_, select
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import JobLease, JobRun
+import jobs
+
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def parse_days(spec: str) -> frozenset[int]:
+    """'mon-fri' / 'mon,wed,fri' / 'daily' -> weekday numbers (Monday = 0)."""
+    spec = spec.strip().lower()
+    if spec in ("daily", "*", ""):
+        return frozenset(range(7))
+    days = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        try:
+            lo, hi = WEEKDAYS.index(first), WEEKDAYS.index(last or first)
+        except ValueError:
+            raise ValueError(f"Invalid weekday in {spec!r}, expected e.g. mon-fri or mon,wed,fri")
+        days.update((lo + i) % 7 for i in range((hi - lo) % 7 + 1))  # "sat-mon" wraps
+    return frozenset(days)
+
+
+# name -> (function, local time, weekdays)
+JOBS = {
+    "mark-absent": (jobs.mark_absent, os.getenv("JOB_MARK_ABSENT_AT", "17:30"),
+                    parse_days(os.getenv("JOB_MARK_ABSENT_DAYS", "mon-fri"))),
+    "delete-expired-students": (jobs.delete_expired_students, os.getenv("JOB_DELETE_EXPIRED_AT", "02:00"),
+                                parse_days("daily")),
+    "cleanup-old-attendance": (jobs.cleanup_old_attendance, os.getenv("JOB_CLEANUP_ATTENDANCE_AT", "03:00"),
+                               parse_days("daily")),
+}
+
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "1800"))
+POLL_SECONDS = 30
+RETRY_FAILED_SECONDS = 900  # a failed scheduled run is retried after this long
+
+
+def _scheduled_today(at: str, days: frozenset[int], now: datetime) -> bool:
+    hour, minute = map(int, at.split(":"))
+    return now.weekday() in days and (now.hour, now.minute) >= (hour, minute)
+
+
+class Scheduler:
+    def __init__(self, job_table: dict):
+        self.jobs = job_table
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._queue: queue.Queue[int] = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.schedule_enabled = False
+
+    # ----------------- Lifecycle -----------------
+    def start(self, schedule: bool = True):
+        with self._lock:
+            self.schedule_enabled = self.schedule_enabled or schedule
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ----------------- Triggers -----------------
+    def trigger(self, name: str) -> int:
+        """Queue a run of `name` on the worker thread; returns the job_runs id."""
+        if name not in self.jobs:
+            raise KeyError(name)
+        db = SessionLocal()
+        try:
+            run = JobRun(name=name, trigger="http", owner=self.owner, status="queued", queued_at=datetime.utcnow())
+            db.add(run)
+            db.commit()
+            run_id = run.id
+        finally:
+            db.close()
+        self.start(schedule=False)
+        self._queue.put(run_id)
+        return run_id
+
+    # ----------------- Worker -----------------
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                run_id = self._queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                run_id = None
+            try:
+                if run_id is not None:
+                    self._run_queued(run_id)
+                if self.schedule_enabled:
+                    self._run_due()
+            except Exception:
+                traceback.print_exc()
+
+    def _run_due(self):
+        now = datetime.now()
+        for name, (_, at, days) in self.jobs.items():
+            if not _scheduled_today(at, days, now) or self._ran_today(name):
+                continue
+            if not self._acquire(name):
+                continue  # another instance holds this job
+            # Re-check under the lease: another instance may have just finished it
+            if self._ran_today(name):
+                self._release(name)
+                continue
+            db = SessionLocal()
+            try:
+                run = JobRun(name=name, trigger="schedule", owner=self.owner, status="queued",
+                             queued_at=datetime.utcnow())
+                db.add(run)
+                db.commit()
+                run_id = run.id
+            finally:
+                db.close()
+            self._execute(run_id, name)
+
+    def _run_queued(self, run_id: int):
+        db = SessionLocal()
+        try:
+            name = db.get(JobRun, run_id).name
+        finally:
+            db.close()
+        if not self._acquire(name):
+            self._finish(run_id, "skipped", error="Job is running on another instance")
+            return
+        self._execute(run_id, name)
+
+    def _execute(self, run_id: int, name: str):
+        """Run the job and record the outcome; the caller holds the lease, released here."""
+        func = self.jobs[name][0]
+        started = time.perf_counter()
+        self._update(run_id, status="running", started_at=datetime.utcnow())
+        db = SessionLocal()
+        try:
+            rows = func(db)
+            self._finish(run_id, "succeeded", rows=rows, duration_ms=(time.perf_counter() - started) * 1000)
+        except Exception as e:
+            db.rollback()
+            traceback.print_exc()
+            self._finish(run_id, "failed", error=f"{type(e).__name__}: {e}",
+                         duration_ms=(time.perf_counter() - started) * 1000)
+        finally:
+            db.close()
+            self._release(name)
+
+    # ----------------- Bookkeeping -----------------
+    def _update(self, run_id: int, **values):
+        db = SessionLocal()
+        try:
+            db.execute(update(JobRun).where(JobRun.id == run_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    def _finish(self, run_id: int, status: str, rows: int | None = None, duration_ms: float | None = None,
+                error: str | None = None):
+        self._update(run_id, status=status, rows=rows, error=error, finished_at=datetime.utcnow(),
+                     duration_ms=round(duration_ms, 1) if duration_ms is not None else None)
+
+    def _ran_today(self, name: str) -> bool:
+        # Start of the local day, expressed in UTC like queued_at
+        today_start = datetime.combine(date.today(), datetime.min.time()) + (datetime.utcnow() - datetime.now())
+        retry_after = datetime.utcnow() - timedelta(seconds=RETRY_FAILED_SECONDS)
+        db = SessionLocal()
+        try:
+            return db.execute(
+                select(JobRun.id).where(
+                    JobRun.name == name,
+                    JobRun.trigger == "schedule",
+                    JobRun.queued_at >= today_start,
+                    or_(
+                        JobRun.status.in_(("running", "succeeded")),
+                        and_(JobRun.status == "failed", JobRun.queued_at >= retry_after),
+                    ),
+                ).limit(1)
+            ).first() is not None
+        finally:
+            db.close()
+
+    # ----------------- Leader election -----------------
+    def _acquire(self, name: str) -> bool:
+        """Take (or renew) the lease on `name` unless another live instance holds it."""
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=LEASE_SECONDS)
+        db = SessionLocal()
+        try:
+            taken = db.execute(
+                update(JobLease)
+                .where(JobLease.name == name, or_(JobLease.expires_at < now, JobLease.owner == self.owner))
+                .values(owner=self.owner, expires_at=expires, acquired_at=now)
+            ).rowcount
+            if taken:
+                db.commit()
+                return True
+            db.add(JobLease(name=name, owner=self.owner, expires_at=expires, acquired_at=now))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()  # row exists and is held by someone else
+            return False
+        finally:
+            db.close()
+
+    def _release(self, name: str):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(JobLease)
+                .where(JobLease.name == name, JobLease.owner == self.owner)
+                .values(expires_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+scheduler = Scheduler(JOBS)
+
+
+def recent_runs(db, name: str | None = None, limit: int = 50) -> list[JobRun]:
+    stmt = select(JobRun).order_by(JobRun.id.desc()).limit(limit)
+    if name:
+        stmt = stmt.where(JobRun.name == name)
+    return db.execute(stmt).scalars().all()
@@ -1,7 +1,9 @@
 # schemas.py
-from pydantic import BaseModel
-from datetime import date
-from typing import Optional
+from pydantic import BaseModel, field_validator
+from datetime import date, datetime
+from typing import Optional, List
+
+from attendance_types import parse_clock
 
 # ----------------- Auth -----------------
 class AdminLogin(BaseModel):
@@ -26,6 +28,24 @@ class StudentResponse(StudentBase):
     class Config:
         orm_mode = True
 
+class StudentOut(BaseModel):
+    # Public columns for GET /students and /students/{roll}; `fields=` returns a subset.
+    # pin (hash) and photo_public_id are never part of it.
+    roll: str
+    name: Optional[str] = None
+    branch: Optional[str] = None
+    dob: Optional[date] = None
+    issue_valid: Optional[str] = None
+    photo: Optional[str] = None
+    device_id: Optional[str] = None
+
+class StudentSearchOut(BaseModel):
+    roll: str
+    name: str
+    branch: str
+    match: str  # "roll" or "name"
+    score: float
+
 # ----------------- Attendance -----------------
 class AttendanceBase(BaseModel):
     roll: str
@@ -42,6 +62,12 @@ class MarkAttendance(BaseModel):
     date: date
     time: str
 
+    @field_validator("time")
+    @classmethod
+    def check_time(cls, v: str) -> str:
+        parse_clock(v)  # stored as TIME; reject what it cannot hold
+        return v
+
 # -------------------- Attendance Analysis --------------------
 class AttendanceAnalysisOut(BaseModel):
     roll: str
@@ -59,6 +85,30 @@ class ForgotPinRequest(BaseModel):
     dob: str  # YYYY-MM-DD
     new_pin: str
 
+# ----------------- Offline Sync -----------------
+class SyncMark(BaseModel):
+    idempotency_key: str
+    date: date
+    time: str
+
+    @field_validator("time")
+    @classmethod
+    def check_time(cls, v: str) -> str:
+        parse_clock(v)
+        return v
+
+class SyncRequest(BaseModel):
+    items: List[SyncMark]
+
+class SyncItemResult(BaseModel):
+    idempotency_key: str
+    status: str  # marked / duplicate / rejected
+    detail: Optional[str] = None
+    replayed: bool = False  # True when the key was already processed by an earlier sync
+
+class SyncResponse(BaseModel):
+    results: List[SyncItemResult]
+
 # ----------------- Student Profile -----------------
 class StudentProfileOut(BaseModel):
     roll: str
@@ -75,7 +125,31 @@ class AttendanceRecord(BaseModel):
     time: str
     status: str
 
+class AttendancePeriodSummary(BaseModel):
+    start: Optional[date] = None  # None for all time
+    present: int
+    absent: int
+    total: int
+    percentage: float
+
+class AttendanceSummaryOut(BaseModel):
+    roll: str
+    as_of: date
+    month: AttendancePeriodSummary
+    term: AttendancePeriodSummary
+    all_time: AttendancePeriodSummary
+    current_streak: int
+    last_marked: Optional[date] = None
+
 class AttendancePdfOut(BaseModel):
+    # One row of the PDF / XLSX attendance report (column order matters)
+    roll: str
+    name: str
+    branch: str
+    date: date
+    time: Optional[str] = None
+    status: str
+
     class Config:
         orm_mode = True
 
@@ -84,3 +158,20 @@ class AttendancePdfOut(BaseModel):
 class ResetDeviceRequest(BaseModel):
     roll: str
 
+
+# ---------------- Scheduled jobs ----------------
+class JobRunOut(BaseModel):
+    id: int
+    name: str
+    trigger: str
+    owner: Optional[str] = None
+    status: str
+    queued_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    rows: Optional[int] = None
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,166 @@
+# search.py
+"""
+Indexed name / roll search for students.
+
+Postgres: pg_trgm GIN index on students.name (serves ILIKE '%q%' and
+similarity ranking). SQLite: an FTS5 trigram table kept in sync with
+students by triggers. Roll numbers are matched by prefix on the primary key.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import Student
+
+
+# Trigram indexes need at least this many characters to narrow the search.
+MIN_TRIGRAM_LEN = 3
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_trgm ON students USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_lower ON students (lower(name) text_pattern_ops)",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(roll UNINDEXED, name, tokenize='trigram')",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_nocase ON students (name COLLATE NOCASE)",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts (roll, name) VALUES (new.roll, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+        DELETE FROM students_fts WHERE roll = old.roll;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF roll, name ON students BEGIN
+        DELETE FROM students_fts WHERE roll = old.roll;
+        INSERT INTO students_fts (roll, name) VALUES (new.roll, new.name);
+    END""",
+]
+
+
+def install_search_index(engine: Engine) -> None:
+    """Create the search index for the current database (idempotent)."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            for ddl in POSTGRES_DDL:
+                conn.execute(text(ddl))
+        elif dialect == "sqlite":
+            for ddl in SQLITE_DDL:
+                conn.execute(text(ddl))
+            # Backfill rows that existed before the triggers were installed.
+            conn.execute(text(
+                "INSERT INTO students_fts (roll, name) "
+                "SELECT roll, name FROM students "
+                "WHERE roll NOT IN (SELECT roll FROM students_fts)"
+            ))
+
+
+def _fts_phrase(q: str) -> str:
+    return '"' + q.replace('"', '""') + '"'
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    return prefix + "\uffff"
+
+
+def like_escape(value: str) -> str:
+    """`value` with LIKE wildcards escaped, for patterns used with ESCAPE '\\'."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def name_filter(db: Session, name: str):
+    """WHERE clause for a substring match on Student.name that can use the search index."""
+    name = name.strip()
+    if db.get_bind().dialect.name == "sqlite" and len(name) >= MIN_TRIGRAM_LEN:
+        # A trigram phrase is a literal substring match: no wildcards to escape
+        return Student.roll.in_(
+            text("SELECT roll FROM students_fts WHERE students_fts MATCH :fts_phrase")
+            .bindparams(fts_phrase=_fts_phrase(name))
+        )
+    # Postgres serves ILIKE '%q%' from the trigram GIN index.
+    return Student.name.ilike(f"%{like_escape(name)}%", escape="\\")
+
+
+def search_students(db: Session, q: str, limit: int = 10, branch: str | None = None) -> list[dict]:
+    """
+    Typeahead search over name (substring) and roll (prefix).
+    Results are ranked: roll prefix hits first, then name prefix hits, then by relevance.
+    """
+    q = q.strip()
+    if not q:
+        return []
+    roll_prefix = q.upper()
+    params = {
+        "roll_lo": roll_prefix,
+        "roll_hi": _prefix_upper_bound(roll_prefix),
+        "name_prefix": f"{like_escape(q.lower())}%",
+        "limit": limit,
+    }
+    branch_sql = ""
+    if branch:
+        branch_sql = "AND s.branch = :branch"
+        params["branch"] = branch
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        params.update(q=q, pattern=f"%{like_escape(q)}%")
+        sql = f"""
+            SELECT s.roll, s.name, s.branch,
+                   (s.roll >= :roll_lo AND s.roll < :roll_hi) AS roll_hit,
+                   (lower(s.name) LIKE :name_prefix ESCAPE '\\') AS name_hit,
+                   similarity(s.name, :q) AS score
+            FROM students s
+            WHERE ((s.roll >= :roll_lo AND s.roll < :roll_hi)
+                   OR s.name ILIKE :pattern ESCAPE '\\'
+                   OR s.name % :q) {branch_sql}
+            ORDER BY roll_hit DESC, name_hit DESC, score DESC, s.roll
+            LIMIT :limit
+        """
+    elif dialect == "sqlite" and len(q) >= MIN_TRIGRAM_LEN:
+        params["phrase"] = _fts_phrase(q)
+        sql = f"""
+            SELECT s.roll, s.name, s.branch,
+                   (s.roll >= :roll_lo AND s.roll < :roll_hi) AS roll_hit,
+                   (lower(s.name) LIKE :name_prefix ESCAPE '\\') AS name_hit,
+                   MAX(-m.score) AS score
+            FROM (
+                SELECT roll, bm25(students_fts) AS score FROM students_fts WHERE students_fts MATCH :phrase
+                UNION ALL
+                SELECT roll, 0.0 FROM students WHERE roll >= :roll_lo AND roll < :roll_hi
+            ) m
+            JOIN students s ON s.roll = m.roll
+            WHERE 1 = 1 {branch_sql}
+            GROUP BY s.roll
+            ORDER BY roll_hit DESC, name_hit DESC, score DESC, s.roll
+            LIMIT :limit
+        """
+    else:
+        # Too short for trigrams: prefix match on the roll and name indexes.
+        if dialect == "sqlite":
+            params.update(name_lo=q, name_hi=_prefix_upper_bound(q))
+            name_sql = "s.name >= :name_lo COLLATE NOCASE AND s.name < :name_hi COLLATE NOCASE"
+        else:
+            name_sql = "lower(s.name) LIKE :name_prefix ESCAPE '\\'"
+        sql = f"""
+            SELECT s.roll, s.name, s.branch,
+                   (s.roll >= :roll_lo AND s.roll < :roll_hi) AS roll_hit,
+                   1 AS name_hit,
+                   1.0 AS score
+            FROM students s
+            WHERE ((s.roll >= :roll_lo AND s.roll < :roll_hi) OR ({name_sql})) {branch_sql}
+            ORDER BY roll_hit DESC, s.name, s.roll
+            LIMIT :limit
+        """
+
+    rows = db.execute(text(sql), params).all()
+    return [
+        {
+            "roll": r.roll,
+            "name": r.name,
+            "branch": r.branch,
+            "match": "roll" if r.roll_hit else "name",
+            "score": round(float(r.score or 0), 4),
+        }
+        for r in rows
+    ]
@@ -0,0 +1,201 @@
+# summaries.py
+"""
+Per-student attendance counters behind /apk/summary.
+
+One attendance_summaries row per student holds present/absent counts for the
+current month, the current term and all time, plus the current streak of
+Present marks. The write paths (/attendance/mark, /apk/sync, the mark-absent
+job) bump the counters in the same transaction as the attendance insert, so
+reading a summary is a single primary-key lookup however long the history is.
+
+Month and term counters roll over lazily: a row whose month_start / term_start
+is not the current one reads as zero and is reset by the next mark.
+
+All-time counters are cumulative: retention cleanup removes old attendance
+rows but leaves the counters alone. A missing row is rebuilt from whatever
+attendance is stored.
+
+Env:
+    TERM_START_MONTHS=1,7    months in which a term starts
+"""
+import os
+from datetime import date
+
+from sqlalchemy import select, insert, update, delete, exists, func, case, and_, or_, literal, Date
+from sqlalchemy.orm import Session, aliased
+
+from models import Student, Attendance, AttendanceSummary
+
+
+TERM_START_MONTHS = sorted(int(m) for m in os.getenv("TERM_START_MONTHS", "1,7").split(","))
+CHUNK = 500
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def term_start(day: date) -> date:
+    started = [m for m in TERM_START_MONTHS if m <= day.month]
+    if started:
+        return date(day.year, started[-1], 1)
+    return date(day.year - 1, TERM_START_MONTHS[-1], 1)
+
+
+# ----------------- Rebuild from attendance -----------------
+def _count(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _streak_from_attendance():
+    """Present marks after the student's latest non-Present mark (correlated on the summary row)."""
+    a, last_break = aliased(Attendance), aliased(Attendance)
+    last_break_date = (
+        select(func.max(last_break.date))
+        .where(last_break.roll == AttendanceSummary.roll, last_break.status != "Present")
+        .correlate(AttendanceSummary)  # two levels down; would otherwise add its own FROM
+        .scalar_subquery()
+    )
+    return (
+        select(func.count())
+        .where(
+            a.roll == AttendanceSummary.roll,
+            a.status == "Present",
+            a.date > func.coalesce(last_break_date, literal(date.min, Date)),
+        )
+        .scalar_subquery()
+    )
+
+
+def backfill(db: Session, rolls: list[str] | None = None, today: date | None = None) -> int:
+    """
+    Create summary rows from stored attendance for `rolls` (default: every
+    student without one). Does not commit.
+    """
+    today = today or date.today()
+    missing = select(Student.roll).where(~exists().where(AttendanceSummary.roll == Student.roll))
+    if rolls is not None:
+        missing = missing.where(Student.roll.in_(rolls))
+    missing_rolls = list(db.execute(missing).scalars())
+
+    m, t = month_start(today), term_start(today)
+    present, absent = Attendance.status == "Present", Attendance.status == "Absent"
+    for i in range(0, len(missing_rolls), CHUNK):
+        chunk = missing_rolls[i:i + CHUNK]
+        rows = (
+            select(
+                Student.roll,
+                literal(m, Date), _count(and_(present, Attendance.date >= m)), _count(and_(absent, Attendance.date >= m)),
+                literal(t, Date), _count(and_(present, Attendance.date >= t)), _count(and_(absent, Attendance.date >= t)),
+                _count(present), _count(absent), literal(0), func.max(Attendance.date),
+            )
+            .select_from(Student)
+            .outerjoin(Attendance, Attendance.roll == Student.roll)
+            .where(Student.roll.in_(chunk))
+            .group_by(Student.roll)
+        )
+        db.execute(insert(AttendanceSummary).from_select(
+            ["roll", "month_start", "month_present", "month_absent", "term_start", "term_present",
+             "term_absent", "total_present", "total_absent", "streak", "last_date"],
+            rows,
+        ))
+        db.execute(
+            update(AttendanceSummary)
+            .where(AttendanceSummary.roll.in_(chunk))
+            .values(streak=_streak_from_attendance())
+            .execution_options(synchronize_session=False)
+        )
+    return len(missing_rolls)
+
+
+# ----------------- Incremental updates -----------------
+def _increment(day: date, status: str) -> dict:
+    """SET clause adding one `status` mark on `day` (SQL reads the old values on the right-hand side)."""
+    s = AttendanceSummary
+    m, t = month_start(day), term_start(day)
+    p, a = int(status == "Present"), int(status == "Absent")
+    return dict(
+        month_present=case((s.month_start == m, s.month_present), else_=0) + p,
+        month_absent=case((s.month_start == m, s.month_absent), else_=0) + a,
+        month_start=m,
+        term_present=case((s.term_start == t, s.term_present), else_=0) + p,
+        term_absent=case((s.term_start == t, s.term_absent), else_=0) + a,
+        term_start=t,
+        total_present=s.total_present + p,
+        total_absent=s.total_absent + a,
+        streak=s.streak + 1 if p else 0,
+        last_date=day,
+    )
+
+
+def _in_order(day: date):
+    s = AttendanceSummary
+    return or_(s.last_date.is_(None), s.last_date < day)
+
+
+def record(db: Session, roll: str, day: date, status: str):
+    """
+    Count a mark that has just been inserted (flushed) for `roll`. Falls back
+    to rebuilding the row when there is none yet or the mark is not newer than
+    the last one counted. Does not commit.
+    """
+    s = AttendanceSummary
+    updated = db.execute(
+        update(s).where(s.roll == roll, _in_order(day)).values(**_increment(day, status))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.execute(delete(s).where(s.roll == roll))
+        backfill(db, [roll], today=day)
+
+
+def record_bulk(db: Session, rolls_query, day: date, status: str) -> int:
+    """
+    Count one `status` mark on `day` for every roll selected by `rolls_query`.
+    Call before inserting those marks. Does not commit.
+    """
+    backfill(db, today=day)
+    s = AttendanceSummary
+    return db.execute(
+        update(s).where(s.roll.in_(rolls_query), _in_order(day)).values(**_increment(day, status))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def remove(db: Session, rolls: list[str]):
+    db.execute(delete(AttendanceSummary).where(AttendanceSummary.roll.in_(rolls)))
+
+
+# ----------------- Read -----------------
+def _period(start: date | None, present: int, absent: int) -> dict:
+    total = present + absent
+    return {
+        "start": start,
+        "present": present,
+        "absent": absent,
+        "total": total,
+        "percentage": round(present / total * 100, 2) if total else 0.0,
+    }
+
+
+def get_summary(db: Session, roll: str, today: date | None = None) -> dict | None:
+    """Summary for `roll`, or None when the student does not exist."""
+    today = today or date.today()
+    row = db.get(AttendanceSummary, roll)
+    if row is None:
+        if not backfill(db, [roll], today=today):
+            return None
+        db.commit()
+        row = db.get(AttendanceSummary, roll)
+    m, t = month_start(today), term_start(today)
+    current_month = row.month_start == m
+    current_term = row.term_start == t
+    return {
+        "roll": roll,
+        "as_of": today,
+        "month": _period(m, row.month_present if current_month else 0, row.month_absent if current_month else 0),
+        "term": _period(t, row.term_present if current_term else 0, row.term_absent if current_term else 0),
+        "all_time": _period(None, row.total_present, row.total_absent),
+        "current_streak": row.streak,
+        "last_marked": row.last_date,
+    }
@@ -1,11 +1,12 @@
+import gzip
+import json
 import os
 import uuid
 from typing import Optional
-from fastapi import UploadFile
+from fastapi import Request, Response, UploadFile
 
 
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/jpg"}
@@ -18,8 +19,25 @@ def save_upload(file: Optional[UploadFile]) -> Optional[str]:
         raise ValueError("Unsupported image type")
     ext = os.path.splitext(file.filename or "")[1] or ".jpg"
     fname = f"{uuid.uuid4().hex}{ext}"
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
     path = os.path.join(UPLOAD_DIR, fname)
     with open(path, "wb") as f:
         f.write(file.file.read())
     # return relative path so frontend can store it
-    return f"uploads/{fname}"
\ No newline at end of file
+    return f"uploads/{fname}"
+
+
+GZIP_MIN_BYTES = 1024
+
+
+def json_response(request: Request, payload) -> Response:
+    """
+    Serialize already-validated rows straight to JSON (no per-row model
+    construction) and gzip the body when the client accepts it.
+    """
+    body = json.dumps(payload, default=str, separators=(",", ":")).encode()
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
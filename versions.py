@@ -0,0 +1,129 @@
+# versions.py
+"""
+Per-student data versions for conditional GETs.
+
+student_versions.version is bumped by database triggers whenever a row in
+students or attendance changes for that roll, so every write path (ORM,
+bulk INSERT/DELETE, scheduled tasks) is covered. Read endpoints turn the
+version into an ETag / Last-Modified and answer revalidation with 304
+without running their row query.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import StudentVersion
+
+
+SQLITE_BUMP = """
+    INSERT INTO student_versions (roll, version, updated_at) VALUES ({ref}.roll, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (roll) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+"""
+
+SQLITE_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{op[0].lower()} AFTER {op} ON {table} BEGIN
+        {SQLITE_BUMP.format(ref=ref)}
+    END"""
+    for table in ("students", "attendance")
+    for op, ref in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old"))
+] + [
+    # A changed roll also invalidates whatever was cached under the old one
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_version_roll AFTER UPDATE OF roll ON {table}
+        WHEN old.roll IS NOT new.roll BEGIN
+        {SQLITE_BUMP.format(ref="old")}
+    END"""
+    for table in ("students", "attendance")
+]
+
+POSTGRES_DDL = [
+    """CREATE OR REPLACE FUNCTION bump_student_version() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            INSERT INTO student_versions (roll, version, updated_at) VALUES (OLD.roll, 1, timezone('utc', now()))
+            ON CONFLICT (roll) DO UPDATE
+                SET version = student_versions.version + 1, updated_at = timezone('utc', now());
+        END IF;
+        IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR OLD.roll IS DISTINCT FROM NEW.roll) THEN
+            INSERT INTO student_versions (roll, version, updated_at) VALUES (NEW.roll, 1, timezone('utc', now()))
+            ON CONFLICT (roll) DO UPDATE
+                SET version = student_versions.version + 1, updated_at = timezone('utc', now());
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+] + [
+    stmt
+    for table in ("students", "attendance")
+    for stmt in (
+        f"DROP TRIGGER IF EXISTS {table}_version ON {table}",
+        f"""CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION bump_student_version()""",
+    )
+]
+
+
+def install_version_triggers(engine: Engine) -> None:
+    """Create the version triggers and seed a version for existing students (idempotent)."""
+    dialect = engine.dialect.name
+    ddl = POSTGRES_DDL if dialect == "postgresql" else SQLITE_DDL if dialect == "sqlite" else []
+    with engine.begin() as conn:
+        for stmt in ddl:
+            conn.execute(text(stmt))
+        conn.execute(text(
+            "INSERT INTO student_versions (roll, version, updated_at) "
+            "SELECT roll, 1, CURRENT_TIMESTAMP FROM students "
+            "WHERE roll NOT IN (SELECT roll FROM student_versions)"
+        ))
+
+
+def get_version(db: Session, roll: str) -> tuple[int, datetime | None]:
+    row = db.execute(
+        select(StudentVersion.version, StudentVersion.updated_at).where(StudentVersion.roll == roll)
+    ).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def make_etag(kind: str, roll: str, version: int, *params) -> str:
+    """Weak ETag for one view of a student's data; params are the resolved query parameters."""
+    digest = hashlib.sha1(repr((kind, roll, params)).encode()).hexdigest()[:12]
+    return f'W/"{version}-{digest}"'
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def conditional(request: Request, response: Response, etag: str, last_modified: datetime | None) -> Response | None:
+    """
+    Attach validators to the response. Returns a 304 response if the client's
+    copy is still current (If-None-Match, or If-Modified-Since when no ETag was sent).
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+
+    fresh = False
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        fresh = "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+    elif if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            modified = last_modified.replace(tzinfo=last_modified.tzinfo or timezone.utc, microsecond=0)
+            fresh = modified <= since
+        except (TypeError, ValueError):
+            fresh = False
+
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None